@@ -0,0 +1,125 @@
+import argparse
+import math
+from test import *
+from engine import MultiWarEngine
+from eventlog import bus, ConsoleSink, DEBUG
+from assetpack import open_pack
+from War import CardImages, CardTable
+
+# War at a table of 2 to 8 or more seats, driven by engine.MultiWarEngine. The seats
+# sit around an ellipse with You at the bottom. Each seat has its hand in front of it
+# and plays towards the middle; war cards stack from the battle card to the centre.
+
+class MultiWarGame(CardTable, Game):
+    # autoplay, fps and event_driven are as in CardTable.init_loop
+    def __init__(self, windowWidth, windowHeight, players=4, dirty_rects=False, engine=None, autoplay=None, fps=10, event_driven=True):
+        super().__init__(windowWidth, windowHeight)
+        self.card_images = CardImages(self, pack=open_pack())
+        self.room = Room('War', self.makeBackground((0, 0, 0)), dirty_rects)
+        self.addRoom(self.room)
+        self.engine = engine or MultiWarEngine(players, ['You'] + [f'Player {i + 2}' for i in range(players - 1)])
+        self.init_loop(autoplay, fps, event_driven)
+        self.plays = []  # (player, card, kind) of the last round, as in RoundResult.plays
+
+        self.card_sprites = {}
+        self.card_order = []
+        self.sprite_pool = []
+
+        self.font = self.makeFont('Arial', 16)
+        self.seats = {}  # player -> (pile centre, battle centre, unit vector towards the centre)
+        self.labels = {}  # player -> TextRectangle
+        self.win_text = TextRectangle('', 0, 0, self.makeFont('Arial', 30), (255, 0, 0))
+        self.layout_seats()
+        self.draw_cards()
+
+    # Spread the seats evenly around an ellipse that leaves room for a card and a label at the edge
+    def layout_seats(self):
+        width, height = self.card_images.card_width, self.card_images.card_height
+        centre_x, centre_y = self.windowWidth / 2, self.windowHeight / 2
+        radius_x = self.windowWidth / 2 - width / 2 - 10
+        radius_y = self.windowHeight / 2 - height / 2 - 30
+        players = self.engine.players
+        for seat, player in enumerate(players):
+            angle = math.pi / 2 + 2 * math.pi * seat / len(players)  # seat 0 at the bottom, then clockwise
+            pile = (centre_x + radius_x * math.cos(angle), centre_y + radius_y * math.sin(angle))
+            battle = (centre_x + 0.6 * (pile[0] - centre_x), centre_y + 0.6 * (pile[1] - centre_y))
+            distance = math.hypot(battle[0] - centre_x, battle[1] - centre_y) or 1
+            inward = ((centre_x - battle[0]) / distance, (centre_y - battle[1]) / distance)
+            self.seats[player] = (pile, battle, inward)
+
+            label = TextRectangle(player.name, 0, 0, self.font, (255, 255, 255))
+            label.rect.centerx = int(pile[0])
+            if math.sin(angle) > 0.3:  # lower seats get their label above the hand, the rest below
+                label.rect.bottom = int(pile[1] - height / 2 - 4)
+            else:
+                label.rect.top = int(pile[1] + height / 2 + 4)
+            self.labels[player] = label
+            self.room.addObject(label)
+
+    def draw_cards(self):
+        layout = []  # (card, center, player, kind), bottom to top
+        for player in self.engine.active:
+            if player.hand:
+                pile, battle, inward = self.seats[player]
+                layout.append((player.hand[-1], (int(pile[0]), int(pile[1])), player, None))
+        depth = {}  # war cards each player has on the table so far
+        for player, card, kind in self.plays:
+            pile, battle, inward = self.seats[player]
+            if kind == 'battle':
+                center = battle
+            else:
+                depth[player] = depth.get(player, 0) + 1
+                step = 14 * depth[player] + (20 if kind == 'up' else 0)  # the face-up card stands out from the pile
+                center = (battle[0] + inward[0] * step, battle[1] + inward[1] * step)
+            layout.append((card, (int(center[0]), int(center[1])), player, kind))
+        self.apply_scene_diff(self.scene_diff(layout))
+
+        for player, label in self.labels.items():
+            if player in self.engine.active:
+                label.setText(f'{player.name}: {len(player.hand)} left, {len(player.won_cards)} won')
+            else:
+                label.setText(f'{player.name}: out')
+            label.rect.centerx = int(self.seats[player][0][0])  # keep the label centred as its width changes
+            label.rect.clamp_ip(self.window.get_rect())
+
+    def play_round(self):
+        self.show_round(self.engine.step())
+
+    def show_round(self, result):
+        self.plays = result.plays
+        for player in result.eliminated:
+            bus.info('game.eliminated', '{player} is out!', player=player.name)
+        if result.war:
+            names = lambda players: ', '.join(player.name for player in players)
+            bus.info('war.start', 'WAR between {players}!', players=names(result.tied[0]))
+            for tied in result.tied[1:]:
+                bus.info('war.again', 'ANOTHER WAR between {players}!', players=names(tied))
+            for player in result.ran_out:
+                bus.info('war.short', "{player} doesn't have enough cards to complete the war", player=player.name)
+        if result.round_winner is not None and bus.wants(DEBUG):
+            bus.debug('round.won', '{player} takes {cards} cards', player=result.round_winner.name, cards=len(result.plays))
+        self.draw_cards()
+
+    def show_winner(self, win_text):
+        if self.engine.winner is not None:
+            bus.info('game.winner', '{player} is the winner!', player=self.engine.winner.name)
+            win_text.setText(f'{self.engine.winner.name} is the winner!')
+        else:
+            bus.info('game.draw', 'Every card ended up in the pot, nobody wins')
+            win_text.setText('Nobody wins')
+        win_text.rect.center = (self.windowWidth // 2, self.windowHeight // 2)
+        self.room.addObject(win_text)
+
+def main():
+    parser = argparse.ArgumentParser(description='Play War with more than two players.')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--autoplay', type=float, metavar='ROUNDS', help="play this many rounds per second by itself, 'inf' for as fast as possible")
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--height', type=int, default=800)
+    args = parser.parse_args()
+    bus.add_sink(ConsoleSink(), DEBUG)
+    MultiWarGame(args.width, args.height, args.players, autoplay=args.autoplay, fps=args.fps).run()
+
+if __name__ == "__main__":
+    main()
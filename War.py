@@ -1,392 +1,570 @@
 import pygame
-import random
+from collections import deque
 from test import *
+from engine import *
+from eventlog import bus, ConsoleSink, DEBUG
+from assetpack import open_pack
 import time
 
-class Card:
-    def __init__(self, suit, value):
-        self.suit = suit
-        self.value = value
-        self.face_up = False  # track whether the card is face up or face down
+# Every card face and the card back decoded once into a single atlas surface.
+# Card objects share subsurfaces of the atlas instead of loading their own image.
+# Images in pack (an assetpack.AssetPack) are taken from there, already decoded.
+# set_size shows the cards at another size: every card is smoothscaled once into an
+# atlas of that size, so drawing never scales. Only the last cached_sizes sizes are
+# kept besides the images on disk, enough to go in and out of fullscreen for free
+# without holding an atlas for every step of a window drag.
+class CardImages:
+    def __init__(self, game, values=range(2, 15), pack=None, cached_sizes=2):
+        self.hits = 0  # lookups served from the atlas
+        self.loads = 0  # images decoded from disk
+        self.packed = 0  # images taken from the pack
+        self.pack = pack
+        self.values = values
+        back = self.load(game, 'cards/TOP.jpg')
+        self.card_width, self.card_height = back.get_size()  # size of the images on disk
+        self.atlas = self.make_atlas(self.card_width, self.card_height)
+        self.images = {None: self.place(self.atlas, back, 0, 0)}  # None is the key of the card back
+        for row, suit in enumerate(SUITS):
+            for column, value in enumerate(values, 1):
+                self.images[(suit, value)] = self.place(self.atlas, self.load(game, f'cards/{suit}{value}.jpg'), column, row)
+        self.originals = self.images
+        self.size = (self.card_width, self.card_height)  # size the cards are shown at
+        self.cached_sizes = cached_sizes
+        self.sizes = {}  # size -> scaled images, least recently used first
+
+    def load(self, game, path):
+        if self.pack is not None and path in self.pack:
+            self.packed += 1
+            return self.pack.image(path)
+        self.loads += 1
+        return game.makeSpriteImage(path)
+
+    def make_atlas(self, card_width, card_height):
+        return pygame.Surface((card_width * (len(self.values) + 1), card_height * len(SUITS))).convert()
+
+    def place(self, atlas, image, column, row):
+        area = pygame.Rect((column * image.get_width(), row * image.get_height()), image.get_size())
+        atlas.blit(image, area)
+        return atlas.subsurface(area)
+
+    def set_size(self, size):
+        if size == (self.card_width, self.card_height):
+            images = self.originals
+        else:
+            images = self.sizes.pop(size, None)
+            if images is None:
+                images = self.scaled(size)
+            self.sizes[size] = images
+            while len(self.sizes) > self.cached_sizes:
+                del self.sizes[next(iter(self.sizes))]
+        self.images = images
+        self.size = size
+
+    def scaled(self, size):
+        originals = self.originals
+        atlas = self.make_atlas(*size)
+        images = {None: self.place(atlas, pygame.transform.smoothscale(originals[None], size), 0, 0)}
+        for row, suit in enumerate(SUITS):
+            for column, value in enumerate(self.values, 1):
+                images[(suit, value)] = self.place(atlas, pygame.transform.smoothscale(originals[(suit, value)], size), column, row)
+        return images
+
+    def key(self, suit, value, face_up):
+        return (suit, value) if face_up else None
+
+    def get(self, card):
+        self.hits += 1
+        return self.images[self.key(card.suit, card.value, card.face_up)]
+
+    def stats(self):
+        return {'images': len(self.images), 'loads': self.loads, 'packed': self.packed, 'hits': self.hits, 'sizes': len(self.sizes)}
+
+# Where things go on the table for a window size. The table was laid out for 800x600:
+# lengths are given for that size and scaled by the smaller of the two ratios, so the
+# table keeps its proportions on anything from a tablet to a wall display.
+class TableLayout:
+    def __init__(self, width, height, base_width=800, base_height=600):
+        self.width = width
+        self.height = height
+        self.scale = min(width / base_width, height / base_height)
+        self.center_x = width // 2
+        self.center_y = height // 2
+
+    # A length on the 800x600 table in pixels on this one
+    def px(self, length):
+        return round(length * self.scale)
+
+    def card_size(self, width, height):
+        return (max(1, self.px(width)), max(1, self.px(height)))
+
+    # Positions counted from the top left and from the bottom left corner
+    def from_top(self, x, y):
+        return (self.px(x), self.px(y))
+
+    def from_bottom(self, x, y):
+        return (self.px(x), self.height - self.px(y))
+
+    # Where a point laid out on old ends up on this layout, everything being placed around the centre
+    def move_from(self, old, point):
+        ratio = self.scale / old.scale
+        return (self.center_x + round((point[0] - old.center_x) * ratio), self.center_y + round((point[1] - old.center_y) * ratio))
 
 class CardGameObject(GameObject):
     def __init__(self, game, card, pos_x, pos_y, is_war_cause_card=False, player=None, is_extra_face_up_card=False):
-        super().__init__(game.makeSpriteImage(f'cards/{card.suit}{card.value}.jpg' if card.face_up else 'cards/TOP.jpg'))
+        super().__init__(game.card_images.get(card))
+        self.set_card(game, card, pos_x, pos_y, is_war_cause_card, player, is_extra_face_up_card)
+        #print(f"{self.player.name} played card with value {self.card.value}")  # Print the card value as soon as it is displayed
+
+    def set_card(self, game, card, pos_x, pos_y, is_war_cause_card=False, player=None, is_extra_face_up_card=False):  # reuse the sprite for another card
         self.card = card
+        self.flip_card(game)
         self.rect.center = (pos_x, pos_y)  # Changed to center the card
         self.is_war_cause_card = is_war_cause_card  # track whether the card is a war cause card
         self.player = player
         self.is_extra_face_up_card = is_extra_face_up_card
-        #print(f"{self.player.name} played card with value {self.card.value}")  # Print the card value as soon as it is displayed
 
     def flip_card(self, game):  # method to flip the card
-        self.image = game.makeSpriteImage(f'cards/{self.card.suit}{self.card.value}.jpg' if self.card.face_up else 'cards/TOP.jpg')
-
-class Deck:
-    def __init__(self):
-        self.cards = []
-        self.populate()
-
-    def populate(self):
-        suits = ['CLUBS', 'DIAMONDS', 'HEARTS', 'SPADES']
-        for value in range(2, 5):  # values from 1 to 14, where 14 represents the ace
-            for suit in suits:
-                self.cards.append(Card(suit, value))
-        
-        for suit in suits:
-            for value in range(5, 15):  # values from 1 to 14, where 14 represents the ace
-                self.cards.append(Card(suit, value))
-
-    def shuffle(self):
-        random.shuffle(self.cards)
-        for card in self.cards:  # Ensure all cards are face up after shuffling
-            card.face_up = True
-
-    def deal(self):
-        return self.cards.pop() if self.cards else None
-
-class Player:
-    def __init__(self, name):
-        self.name = name
-        self.hand = []
-        self.won_cards = []
-
-    def take_card(self, card):
-        self.hand.append(card)
-
-    def play_card(self, face_up=True):
-        if self.hand:
-            card = self.hand.pop()
-            if card == None:
-                return None
-            card.face_up = face_up  # specify whether the card is face up or face down
-            if not self.hand and self.won_cards:  # reshuffle won cards if hand is empty
-                print("Reshuffling cards!")
-                self.hand = self.won_cards
-                self.won_cards = []
-                self.shuffle_hand()
-            return card
-        if not self.hand and self.won_cards:
-            print("Reshuffling cards!")
-            self.hand = self.won_cards
-            self.won_cards = []
-            self.shuffle_hand()
-        print("No cards left in hand!")
-        return None
-
-    def place_card_face_down(self):
-        return self.play_card(False)  # the card is face down
-
-    def shuffle_hand(self):
-        random.shuffle(self.hand)
-        for card in self.hand:  # Ensure all cards are face up after shuffling
-            card.face_up = True
-
-class WarGame(Game):
-    def __init__(self, windowWidth, windowHeight):
-        super().__init__(windowWidth, windowHeight)
-        self.room = Room('War', self.makeBackground((0, 0, 0)))  # make a black background
+        image = game.card_images.get(self.card)
+        if image is not self.image:
+            self.image = image
+            if image.get_size() != self.rect.size:  # the cards are shown at another size now
+                center = self.rect.center
+                self.rect.size = image.get_size()
+                self.rect.center = center
+
+# Keeps the card sprites on the table in step with a layout, reusing sprites between
+# rounds, and runs the game loop: clicks or autoplay, the profiler keys and drawing.
+# Needs card_images, room, card_sprites, card_order, sprite_pool, engine and win_text,
+# init_loop to have been called, and play_round, show_round and show_winner.
+class CardTable:
+    # Compare a card layout with the card sprites on the table
+    def scene_diff(self, layout):
+        diff = {'add': [], 'move': [], 'flip': [], 'remove': [], 'order': [card for card, center, player, kind in layout]}
+        current = dict(self.card_sprites)
+        for card, center, player, kind in layout:
+            sprite = current.pop(card, None)
+            if sprite is None:
+                diff['add'].append((card, center, player, kind))
+                continue
+            if sprite.rect.center != center:
+                diff['move'].append((sprite, center))
+            if sprite.image is not self.card_images.get(card):
+                diff['flip'].append(sprite)
+        diff['remove'] = list(current.values())
+        return diff
+
+    # Make the table match a scene_diff, touching only the sprites that changed
+    def apply_scene_diff(self, diff):
+        for sprite in diff['remove']:
+            self.room.removeObject(sprite)
+            del self.card_sprites[sprite.card]
+            self.sprite_pool.append(sprite)
+        for sprite, center in diff['move']:
+            sprite.rect.center = center
+        for sprite in diff['flip']:
+            sprite.flip_card(self)
+        for card, (pos_x, pos_y), player, kind in diff['add']:
+            if self.sprite_pool:
+                sprite = self.sprite_pool.pop()
+                sprite.set_card(self, card, pos_x, pos_y, kind == 'battle', player, kind == 'up')
+            else:
+                sprite = CardGameObject(self, card, pos_x, pos_y, kind == 'battle', player, kind == 'up')
+            self.room.addObject(sprite)
+            self.card_sprites[card] = sprite
+
+        # New sprites end up on top, restack only if that isn't the layout's order
+        removed = set(diff['remove'])
+        stacked = [sprite for sprite in self.card_order if sprite not in removed]
+        stacked.extend(self.card_sprites[card] for card, center, player, kind in diff['add'])
+        self.card_order = [self.card_sprites[card] for card in diff['order']]
+        if stacked != self.card_order:
+            for sprite in self.card_order:
+                self.room.raiseObject(sprite)
+
+    # autoplay plays that many rounds per second without clicking, float('inf') as many as fit
+    # in each frame. The rounds run on a fixed timestep apart from drawing, which happens fps
+    # times per second and only shows the latest round.
+    # event_driven sleeps until the next input whenever nothing can change by itself, that is
+    # between clicks and once the game is over, and only draws after something changed.
+    def init_loop(self, autoplay, fps, event_driven):
+        if autoplay is not None and autoplay <= 0:
+            raise ValueError(f'autoplay has to be a positive number of rounds per second, got {autoplay}')
+        self.autoplay = autoplay
+        self.fps = fps
+        self.event_driven = event_driven
+        self.pending_time = 0.0  # autoplay time not spent on rounds yet
+
+    # Play the rounds autoplay owes for the time that passed, stopping at the deadline so the frame still gets drawn
+    def autoplay_rounds(self, elapsed, deadline):
+        result = None
+        if self.autoplay == float('inf'):
+            while not self.engine.finished() and time.perf_counter() < deadline:
+                result = self.engine.step()
+        else:
+            self.pending_time += elapsed
+            step_time = 1.0 / self.autoplay
+            while not self.engine.finished() and self.pending_time >= step_time:
+                if time.perf_counter() >= deadline:  # can't keep up, drop the backlog instead of falling further behind
+                    self.pending_time = 0.0
+                    break
+                result = self.engine.step()
+                self.pending_time -= step_time
+        if result is not None:
+            self.show_autoplayed(result)
+
+    # Show the last of the rounds autoplay_rounds played
+    def show_autoplayed(self, result):
+        self.show_round(result)
+
+    # Whether show_winner should be called once the engine has finished
+    def game_over(self):
+        return self.engine.finished()
+
+    # Once the engine has finished nothing is played any more and the loop goes idle,
+    # returns whether it has
+    def end_game(self):
+        if not self.engine.finished():
+            return False
+        if self.game_over():
+            self.show_winner(self.win_text)
+        return True
+
+    # Events for this table only, returns True if the event was used
+    def handle_event(self, e):
+        return False
+
+    # F3 turns the frame profiler on and off, F4 writes what it has recorded
+    def profiler_key(self, key):
+        if key == pygame.K_F3:
+            profiler.toggle()
+            bus.info('profiler.toggle', 'Profiler {state}', state='on' if profiler.enabled else 'off')
+        elif key == pygame.K_F4:
+            self.dump_profile()
+
+    def dump_profile(self, name='profile'):
+        profiler.dumpJson(f'{name}.json')
+        profiler.dumpChromeTrace(f'{name}.trace.json')
+        bus.info('profiler.dump', 'Profile of {frames} frames written to {name}.json and {name}.trace.json', frames=len(profiler.frames), name=name)
+
+    def run(self):
+        self.start()
+        over = False
+        last_frame = time.perf_counter()
+        while self.running:
+            idle = self.event_driven and (over or self.autoplay is None)
+            if idle:
+                events = self.getEvents(wait=True)  # sleeping until something happens isn't part of a frame
+            frame_start = time.perf_counter()
+            profiler.beginFrame()
+            if not idle:
+                with profiler.phase('events'):
+                    events = self.getEvents()
+            # dragging a window edge sends a VIDEORESIZE for every step, only the size it ends on is laid out
+            last_resize = next((e for e in reversed(events) if e.type == pygame.VIDEORESIZE), None)
+            for e in events:
+                if e.type == pygame.QUIT:
+                    self.running = False
+                elif e.type == pygame.VIDEORESIZE and e is not last_resize:
+                    pass
+                elif e.type == pygame.KEYDOWN and e.key in (pygame.K_F3, pygame.K_F4):
+                    self.profiler_key(e.key)
+                elif self.handle_event(e):
+                    pass
+                elif over:
+                    pass
+                elif e.type == pygame.MOUSEBUTTONDOWN and self.autoplay is None:
+                    self.play_round()
+                    self.requestRedraw()
+                    over = self.end_game()
+
+            if self.autoplay is not None and not over:
+                with profiler.phase('autoplay'):
+                    self.autoplay_rounds(frame_start - last_frame, frame_start + 1.0 / self.fps)
+                over = self.end_game()
+                self.requestRedraw()
+            last_frame = frame_start
+
+            if self.redrawNeeded or not self.event_driven:
+                self.redrawNeeded = False
+                self.room.updateObjects()
+                if self.room.dirtyRects:
+                    rects = self.room.renderDirty(self)
+                    if rects:
+                        with profiler.phase('display.update'):
+                            pygame.display.update(rects)
+                else:
+                    self.room.renderBackground(self)
+                    self.room.renderObjects(self)
+                    with profiler.phase('display.flip'):
+                        pygame.display.flip()
+            with profiler.phase('clock.tick'):  # time spent waiting for the next frame
+                self.clock.tick(self.fps)
+            profiler.endFrame()
+        if profiler.frames:
+            self.dump_profile()
+        pygame.quit()
+
+
+class WarGame(CardTable, Game):
+    # autoplay, fps and event_driven are as in CardTable.init_loop.
+    # flags go to pygame.display.set_mode: with pygame.RESIZABLE the table follows the window,
+    # pygame.FULLSCREEN fills the screen. F11 switches between a window and fullscreen.
+    def __init__(self, windowWidth, windowHeight, dirty_rects=False, engine=None, autoplay=None, fps=10, event_driven=True, flags=0):
+        super().__init__(windowWidth, windowHeight, flags)
+        self.windowed_size = (windowWidth, windowHeight)  # to go back to when leaving fullscreen
+        self.layout = TableLayout(self.windowWidth, self.windowHeight)
+        self.card_images = CardImages(self, pack=open_pack())  # decode every card image up front, not in the middle of a click
+        self.card_images.set_size(self.layout.card_size(self.card_images.card_width, self.card_images.card_height))
+        self.room = Room('War', self.makeBackground((0, 0, 0)), dirty_rects)  # make a black background, dirty_rects only redraws what changed
         self.addRoom(self.room)
-        self.player1 = Player('Opponent')
-        self.player2 = Player('You')
-        self.deck = Deck()
-        self.deck.shuffle()
-        self.cards_in_play = []
+        self.engine = engine or WarEngine('Opponent', 'You')  # owns the hands, the pot and the rules; a gametrace.ReplayEngine replays a recorded game
+        self.player1 = self.engine.player1
+        self.player2 = self.engine.player2
         self.turn_over = False
         self.war = False
-        self.war_cards = []
-        self.total_cards_played = 0  # Initialize total cards played
-        self.player1_win = False
-        self.player2_win = False
+        self.init_loop(autoplay, fps, event_driven)
+        self.war_cards = []  # (player, card, kind) of the war cards on the table, as in RoundResult.plays
+
+        # The card sprites on the table are kept between rounds, each round only applies the changes
+        self.card_sprites = {}  # card -> CardGameObject in the room
+        self.card_order = []  # card sprites in drawing order
+        self.sprite_pool = []  # CardGameObjects not on the table, ready to be reused
         
         # Create a font
-        self.font = self.makeFont('Arial', 20)
+        self.font = self.makeFont('Arial', self.layout.px(20))
 
         # Create a TextRectangle for each player
-        self.player1_text = TextRectangle(f'{self.player1.name}: 0 cards won', 100, 40, self.font, (255, 255, 255))
-        self.player2_text = TextRectangle(f'{self.player2.name}: 0 cards won', 100, windowHeight - 60, self.font, (255, 255, 255))
+        self.player1_text = TextRectangle(f'{self.player1.name}: 0 cards won', *self.layout.from_top(100, 40), self.font, (255, 255, 255))
+        self.player2_text = TextRectangle(f'{self.player2.name}: 0 cards won', *self.layout.from_bottom(100, 60), self.font, (255, 255, 255))
 
         # Create a TextRectangle for each player's remaining cards
-        self.player1_remaining_text = TextRectangle(f'{self.player1.name}: {len(self.player1.hand)} cards left', 100, 60, self.font, (255, 255, 255))
-        self.player2_remaining_text = TextRectangle(f'{self.player2.name}: {len(self.player2.hand)} cards left', 100, windowHeight - 30, self.font, (255, 255, 255))
-
-        self.deal_cards()  # Moved this line after the creation of player1_text and player2_text
-
-    def deal_cards(self):
-        total_cards_dealt = 0
-        while len(self.deck.cards) > 0:
-            card = self.deck.deal()
-            card.face_up = True  # Set the initial deal to face-up
-            self.player1.take_card(card)
-            total_cards_dealt += 1
-            card = self.deck.deal()
-            card.face_up = True  # Set the initial deal to face-up
-            self.player2.take_card(card)
-            total_cards_dealt += 1
-        print(f"Total cards dealt: {total_cards_dealt}")
+        self.player1_remaining_text = TextRectangle(f'{self.player1.name}: {len(self.player1.hand)} cards left', *self.layout.from_top(100, 60), self.font, (255, 255, 255))
+        self.player2_remaining_text = TextRectangle(f'{self.player2.name}: {len(self.player2.hand)} cards left', *self.layout.from_bottom(100, 30), self.font, (255, 255, 255))
+
+        # Add the TextRectangles to the room, they stay there for the whole game
+        self.room.addObject(self.player1_text)
+        self.room.addObject(self.player2_text)
+        self.room.addObject(self.player1_remaining_text)
+        self.room.addObject(self.player2_remaining_text)
+
+        win_font = self.makeFont('Arial', self.layout.px(30))
+        self.win_text = TextRectangle(f'{self.player1.name} is the winner!', self.windowWidth // 2 - 150 , self.windowHeight // 2 - 10, win_font, (255, 0, 0))
+        self.win_text.rect.center = (self.windowWidth // 2, self.windowHeight // 2)
+
+        self.draw_cards()  # the engine has already dealt, show the top cards
+
+    @property
+    def cards_in_play(self):
+        return self.engine.cards_in_play
+
+    @property
+    def total_cards_played(self):
+        return self.engine.total_cards_played
+
+    @property
+    def player1_win(self):
+        return self.engine.player1_win
+
+    @property
+    def player2_win(self):
+        return self.engine.player2_win
+
+    # Start over with a new engine, keeping the window, the card images and the sprites
+    def new_game(self, engine=None):
+        self.engine = engine or WarEngine('Opponent', 'You')
+        self.player1 = self.engine.player1
+        self.player2 = self.engine.player2
+        self.turn_over = False
+        self.war = False
+        self.war_cards.clear()
+        self.pending_time = 0.0
+        self.draw_cards()
+
+    # Go back to a snapshot taken with self.engine.snapshot() and show it
+    def restore(self, snapshot):
+        self.engine.restore(snapshot)
+        self.turn_over = False
+        self.war = False
+        self.war_cards.clear()
         self.draw_cards()
 
+    @profiled('draw_cards')
     def draw_cards(self, draw_new = True):
-        self.room.roomObjects.empty()  # Remove all objects from the room
+        layout = []  # (card, center, player, kind) for every card on the table, bottom to top
+        table = self.layout
+        player1_y = table.center_y - table.px(75)  # rows of the two players' cards
+        player2_y = table.center_y + table.px(75)
         # print(f"Total cards played: {self.total_cards_played}")  # Print total cards played at the start of each turn
         # Draw only the top card of each player's hand
         if draw_new:
             if self.player1.hand:
-                card_object = CardGameObject(self, self.player1.hand[-1], self.windowWidth // 2, self.windowHeight // 2 - 75, player=self.player1)  # Changed the y-coordinate to add space between the cards
-                self.room.addObject(card_object)
+                layout.append((self.player1.hand[-1], (table.center_x, player1_y), self.player1, None))  # Changed the y-coordinate to add space between the cards
             else:
-                print("--------------------------- ERROR ---------------------------")
+                bus.error('draw.empty_hand', '--------------------------- ERROR ---------------------------')
             if self.player2.hand:
-                card_object = CardGameObject(self, self.player2.hand[-1], self.windowWidth // 2, self.windowHeight // 2 + 75, player=self.player2)  # Changed the y-coordinate to add space between the cards
-                self.room.addObject(card_object)
+                layout.append((self.player2.hand[-1], (table.center_x, player2_y), self.player2, None))  # Changed the y-coordinate to add space between the cards
 
         # Draw the war cards if in war
         if self.war:
             offset = 75
-            player1_offset = offset  # Offsets for the cards of player 1
+            player1_offset = offset  # Offsets for the cards of player 1, on the 800x600 table
             player2_offset = offset  # Offsets for the cards of player 2
-            for card_object in self.war_cards:
-                self.room.addObject(card_object)
-                print(card_object.card.face_up, card_object.rect.center, card_object.is_war_cause_card, card_object.player, card_object.is_extra_face_up_card)
-                if not card_object.is_war_cause_card:  # Only set the position if this is not a war cause card
-                    if card_object.player == self.player1:
-                        if card_object.is_extra_face_up_card:  # If the card is the extra face-up card
-                            card_object.rect.center = (self.windowWidth // 2 - player1_offset - 0, self.windowHeight // 2 - 75)
-                            player1_offset += 75
-                        else:
-                            card_object.rect.center = (self.windowWidth // 2 - player1_offset, self.windowHeight // 2 - 75)
-                            player1_offset += 30
-                    elif card_object.player == self.player2:
-                        if card_object.is_extra_face_up_card:  # If the card is the extra face-up card
-                            card_object.rect.center = (self.windowWidth // 2 + player2_offset + 0, self.windowHeight // 2 + 75)
-                            player2_offset += 75
-                        else:
-                            card_object.rect.center = (self.windowWidth // 2 + player2_offset, self.windowHeight // 2 + 75)
-                            player2_offset += 30
+            for player, card, kind in self.war_cards:
+                if kind == 'battle':  # war cause cards stay on the card piles
+                    center = (table.center_x, player1_y if player == self.player1 else player2_y)
+                elif player == self.player1:
+                    center = (table.center_x - table.px(player1_offset), player1_y)
+                    player1_offset += 75 if kind == 'up' else 30  # the extra face-up card gets more room
+                else:
+                    center = (table.center_x + table.px(player2_offset), player2_y)
+                    player2_offset += 75 if kind == 'up' else 30
+                if bus.wants(DEBUG):
+                    bus.debug('draw.war_card', '{face_up} {center} {battle} {player} {up}', face_up=card.face_up, center=center, battle=kind == 'battle', player=player, up=kind == 'up')
+                layout.append((card, center, player, kind))
 
+        self.apply_scene_diff(self.scene_diff(layout))
         
         self.player1_text.setText(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
         self.player2_text.setText(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
 
-        # Add the TextRectangles to the room
-        self.room.addObject(self.player1_text)
-        self.room.addObject(self.player2_text)
-
-        # Update and add the TextRectangles for remaining cards
+        # Update the TextRectangles for remaining cards
         self.player1_remaining_text.setText(f'{self.player1.name}: {len(self.player1.hand)} cards left')
         self.player2_remaining_text.setText(f'{self.player2.name}: {len(self.player2.hand)} cards left')
         #print(f'{self.player1.name}: {len(self.player1.hand)} cards left, {self.player2.name}: {len(self.player2.hand)} cards left')  # Print the updated remaining cards text
-        self.room.addObject(self.player1_remaining_text)
-        self.room.addObject(self.player2_remaining_text)
+
+    # Lay the table out for a new window size. The sprites on the table stay and are moved
+    # and given the card images for the new size, so nothing about the round changes.
+    def resize(self, width, height, flags=None):
+        old = self.layout
+        self.resizeWindow(width, height, flags)
+        self.layout = table = TableLayout(self.windowWidth, self.windowHeight)
+        self.room.setBackground(self.makeBackground((0, 0, 0)))
+        self.card_images.set_size(table.card_size(self.card_images.card_width, self.card_images.card_height))
+        for sprite in self.card_order:
+            sprite.flip_card(self)
+            sprite.rect.center = table.move_from(old, sprite.rect.center)
+
+        self.font = self.makeFont('Arial', table.px(20))
+        for text, position in ((self.player1_text, table.from_top(100, 40)), (self.player1_remaining_text, table.from_top(100, 60)),
+                               (self.player2_text, table.from_bottom(100, 60)), (self.player2_remaining_text, table.from_bottom(100, 30))):
+            text.setFont(self.font)
+            text.rect.topleft = position
+        self.win_text.setFont(self.makeFont('Arial', table.px(30)))
+        self.win_text.rect.center = (self.windowWidth // 2, self.windowHeight // 2)
+
+    def toggle_fullscreen(self):
+        if self.windowFlags & pygame.FULLSCREEN:
+            self.resize(*self.windowed_size, self.windowFlags & ~pygame.FULLSCREEN | pygame.RESIZABLE)
+        else:
+            self.windowed_size = (self.windowWidth, self.windowHeight)
+            self.resize(0, 0, pygame.FULLSCREEN)
 
     def set_winner(self):
         self.war = False
-        if self.player1_win == True:
-            self.player1.won_cards = [None] * len(self.player1.won_cards)
-            self.player1.hand = [None] * (52 - len(self.player1.won_cards))
-            self.player2.won_cards = []
-            self.player2.won_cards = []
+        if self.engine.winner == self.player1:
+            self.player1.won_cards = deque([None] * len(self.player1.won_cards))
+            self.player1.hand = deque([None] * (self.engine.card_count - len(self.player1.won_cards)))
+            self.player2.won_cards = deque()
+            self.player2.won_cards = deque()
             self.draw_cards(False)
-        if self.player2_win == True:
-            self.player2.won_cards = [None] * len(self.player1.won_cards)
-            self.player2.hand = [None] * (52 - len(self.player1.won_cards))
-            self.player1.won_cards = []
-            self.player1.won_cards = []
+        if self.engine.winner == self.player2:
+            self.player2.won_cards = deque([None] * len(self.player1.won_cards))
+            self.player2.hand = deque([None] * (self.engine.card_count - len(self.player1.won_cards)))
+            self.player1.won_cards = deque()
+            self.player1.won_cards = deque()
             self.draw_cards(False)
 
+    # One click: play a round and return its RoundResult, or clear the last war off the table and return None
+    @profiled('play_round')
     def play_round(self):
         if not self.turn_over:
-            card1 = self.player1.play_card()
-            card2 = self.player2.play_card()
-            if card1 == None:
-                self.player1_win = False
-                self.player2_win = True
-                return
-            elif card2 == None:
-                self.player1_win = True
-                self.player2_win = False
-                return
-            draw_new = True
-            if card1 and card2:  # if both players have cards to play
-                self.cards_in_play.extend([card1, card2])
-                self.total_cards_played += 2  # Increase total cards played by 2
-                if card1.value > card2.value:
-                    self.player1.won_cards.extend(self.cards_in_play)
-                    self.cards_in_play = []
-                    self.turn_over = True
-                    self.war = False
-                    # Update player 1's TextRectangle
-                    self.player1_text.setText(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                    #print(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                    self.draw_cards(draw_new = draw_new)
-                elif card1.value < card2.value:
-                    self.player2.won_cards.extend(self.cards_in_play)
-                    self.cards_in_play = []
-                    self.turn_over = True
-                    self.war = False
-                    # Update player 2's TextRectangle
-                    self.player2_text.setText(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                    #print(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                    self.draw_cards(draw_new = draw_new)
-                else:
-                    print("WAR!")
-                    self.war = True
-                    draw_new = False
-                    war_cause_cards = [card1, card2]  # save the cards that caused the war
-                    self.war_cards.clear()  # clear old war cards
-                    self.cards_in_play = []
-
-                    for card in war_cause_cards:
-                            card_object = CardGameObject(self, card, self.windowWidth // 2, self.windowHeight // 2 - 75 if card == card1 else self.windowHeight // 2 + 75, is_war_cause_card=True, player=self.player1 if card == card1 else self.player2)
-                            self.war_cards.append(card_object)
-                            self.cards_in_play.append(card)
-                    
-                    t = 2
-                    while t:
-                        t -= 1
-                        # add the cards that caused the war back to the war_cards
-
-                        for _ in range(3):  # place three cards face down
-                            if self.player1.hand:
-                                card = self.player1.place_card_face_down()
-                                card_object = CardGameObject(self, card, self.windowWidth // 2, self.windowHeight // 2 - 75, player=self.player1)  # Set the position of war_cause_cards to the default card piles
-                                self.war_cards.append(card_object)
-                                self.cards_in_play.append(card)  # Add the face-down cards to self.cards_in_play
-                                self.total_cards_played += 1  # Increase total cards played by 1
-                            else:
-                                print("Player 1 doesn't have enough cards to complete the war")
-                                # Player 1 doesn't have enough cards to complete the war
-                                self.player2.won_cards.extend(self.cards_in_play)
-                                self.cards_in_play = []
-                                self.turn_over = True
-                                self.war = False
-                                # Update player 2's TextRectangle
-                                self.player2_text.setText(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                                print(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                                return
-                            if self.player2.hand:
-                                card = self.player2.place_card_face_down()
-                                card_object = CardGameObject(self, card, self.windowWidth // 2, self.windowHeight // 2 + 75, player=self.player2)  # Set the position of war_cause_cards to the default card piles
-                                self.war_cards.append(card_object)
-                                self.cards_in_play.append(card)  # Add the face-down cards to self.cards_in_play
-                                self.total_cards_played += 1  # Increase total cards played by 1
-                            else:
-                                print("Player 2 doesn't have enough cards to complete the war")
-                                # Player 2 doesn't have enough cards to complete the war
-                                self.player1.won_cards.extend(self.cards_in_play)
-                                self.cards_in_play = []
-                                self.turn_over = True
-                                self.war = False
-                                # Update player 1's TextRectangle
-                                self.player1_text.setText(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                                print(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                                return
-                        # add one more card face up from each player
-                        if self.player1.hand:
-                            card1 = self.player1.play_card(face_up=True)
-                            card_object = CardGameObject(self, card1, 0, 0, is_war_cause_card=False, player=self.player1, is_extra_face_up_card=True)  # Set the position of war_cause_cards to the default card piles
-                            self.war_cards.append(card_object)
-                            self.cards_in_play.append(card1)
-                            self.total_cards_played += 1  # Increase total cards played by 1
-                        else:
-                            print("Player 1 doesn't have enough cards to complete the war")
-                            # Player 1 doesn't have enough cards to complete the war
-                            self.player2.won_cards.extend(self.cards_in_play)
-                            self.cards_in_play = []
-                            self.turn_over = True
-                            self.war = False
-                            # Update player 2's TextRectangle
-                            self.player2_text.setText(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                            print(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                            return
-                        if self.player2.hand:
-                            card2 = self.player2.play_card(face_up=True)
-                            card_object = CardGameObject(self, card2, 0, 0, is_war_cause_card=False, player=self.player2, is_extra_face_up_card=True)  # Set the position of war_cause_cards to the default card piles
-                            self.war_cards.append(card_object)
-                            self.cards_in_play.append(card2)
-                            self.total_cards_played += 1  # Increase total cards played by 1
-                        else:
-                            print("Player 2 doesn't have enough cards to complete the war")
-                            # Player 2 doesn't have enough cards to complete the war
-                            self.player1.won_cards.extend(self.cards_in_play)
-                            self.cards_in_play = []
-                            self.turn_over = True
-                            self.war = False
-                            # Update player 1's TextRectangle
-                            self.player1_text.setText(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                            print(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                            return
-
-                        self.draw_cards(draw_new = draw_new)
-
-                        print(f'WAR: Player 1: {card1.value} vs. Player 2: {card2.value}')
-                        # Determine the winner of the war
-                        if card1.value > card2.value:
-                            self.player1.won_cards.extend(self.cards_in_play)
-                            self.cards_in_play = []
-                            self.turn_over = True
-                            self.war = False
-                            # Update player 1's TextRectangle
-                            self.player1_text.setText(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                            print(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
-                            return
-                        elif card1.value < card2.value:
-                            self.player2.won_cards.extend(self.cards_in_play)
-                            self.cards_in_play = []
-                            self.turn_over = True
-                            self.war = False
-                            # Update player 2's TextRectangle
-                            self.player2_text.setText(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                            print(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
-                            return
-                        else:
-                            print("ANOTHER WAR!")
-                            self.war = True
-                            # self.war_cards[-1]
-                            # self.war = True
-                            # self.turn_over = False
-                            # self.war_cards.clear()  # clear old war cards
-                            # self.cards_in_play = []
+            result = self.engine.step()
+            self.show_round(result)
+            return result
         else:
             self.turn_over = False
             self.war_cards.clear()
+            return None
 
-    def run(self):
-        self.start()
-        
-        font = self.makeFont('Arial', 30)
-        win_text = TextRectangle(f'{self.player1.name} is the winner!', self.windowWidth // 2 - 150 , self.windowHeight // 2 - 10, font, (255, 0, 0))
-        win_text.rect.center = (self.windowWidth // 2, self.windowHeight // 2)
-        #self.room.addObject(win_text)
-        winner = False
-        while self.running:
-            for e in pygame.event.get():
-                if e.type == pygame.QUIT:
-                    self.running = False
-                elif winner == True:
-                    pass
-                elif e.type == pygame.MOUSEBUTTONDOWN:
-                    self.play_round()
-                    if len(self.player1.won_cards) + len(self.player1.hand) == 52 or self.player1_win:
-                        print(f"{self.player1.name} is the winner!")
-                        self.set_winner()
-                        win_text.setText(f"{self.player1.name} is the winner!")
-                        self.room.addObject(win_text)
-                        winner = True
-                    elif len(self.player2.won_cards) + len(self.player2.hand) == 52 or self.player2_win:
-                        print(f"{self.player2.name} is the winner!")
-                        self.set_winner()
-                        win_text.setText(f"{self.player2.name} is the winner!")
-                        self.room.addObject(win_text)
-                        winner = True
-                    
-            self.room.updateObjects()
-            self.room.renderBackground(self)
-            self.room.renderObjects(self)
-            pygame.display.flip()
-            self.clock.tick(10)
-        pygame.quit()
+    # Put what happened in one engine round on the table
+    def show_round(self, result):
+        self.turn_over = result.round_winner is not None
+        if not result.plays:  # a player had no card to play, the game is over
+            return
+        if not result.war:
+            self.war = False
+            self.draw_cards()
+            return
+
+        bus.info('war.start', 'WAR!')
+        self.war = True
+        self.war_cards.clear()  # clear old war cards
+        shown = []  # war cards as they were when the last complete war iteration was drawn
+        face_up_cards = []
+        for player, card, kind in result.plays:
+            if kind == 'up':
+                face_up_cards.append(card)
+            self.war_cards.append((player, card, kind))
+            if kind == 'up' and len(face_up_cards) % 2 == 0:
+                shown = list(self.war_cards)
+                card1, card2 = face_up_cards[-2:]
+                bus.info('war.face_up', 'WAR: Player 1: {value1} vs. Player 2: {value2}', value1=card1.value, value2=card2.value)
+                if card1.value == card2.value:
+                    bus.info('war.again', 'ANOTHER WAR!')
+
+        if result.short is not None:
+            bus.info('war.short', "{player} doesn't have enough cards to complete the war", player='Player 1' if result.short == self.player1 else 'Player 2')
+        self.war_cards = shown
+        if shown:
+            self.draw_cards(draw_new = False)
+        else:
+            # nothing new to draw, only the winner's score changes
+            self.player1_text.setText(f'{self.player1.name}: {len(self.player1.won_cards)} cards won')
+            self.player2_text.setText(f'{self.player2.name}: {len(self.player2.won_cards)} cards won')
+        if result.round_winner is not None:
+            bus.info('war.won', '{player}: {won} cards won', player=result.round_winner.name, won=len(result.round_winner.won_cards))
+        self.war = self.engine.war
+
+    def show_autoplayed(self, result):
+        self.turn_over = False
+        self.show_round(result)
+        if result.war and not self.war_cards:  # the war ended before any of it could be shown
+            self.draw_cards()
+
+    # Only a winner is shown, a cycle or a replay cut short leave the last round on the table
+    def game_over(self):
+        return self.engine.winner is not None
+
+    def handle_event(self, e):
+        if e.type == pygame.VIDEORESIZE and not self.windowFlags & pygame.FULLSCREEN:
+            self.resize(e.w, e.h)
+        elif e.type == pygame.KEYDOWN and e.key == pygame.K_F11:
+            self.toggle_fullscreen()
+        else:
+            return False
+        return True
+
+    def show_winner(self, win_text):
+        bus.info('game.winner', '{player} is the winner!', player=self.engine.winner.name)
+        self.set_winner()
+        win_text.setText(f"{self.engine.winner.name} is the winner!")
+        self.room.addObject(win_text)
 
 if __name__ == "__main__":
-    game = WarGame(800, 600)
+    import argparse
+    parser = argparse.ArgumentParser(description='Play War.')
+    parser.add_argument('--autoplay', type=float, metavar='ROUNDS', help="play this many rounds per second by itself, 'inf' for as fast as possible")
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--profile', action='store_true', help='record frame timings from the start (F3 toggles them at any time)')
+    parser.add_argument('--poll', action='store_true', help='draw fps frames per second even when nothing happens')
+    parser.add_argument('--size', default='800x600', help='window size as WIDTHxHEIGHT, the window can be resized')
+    parser.add_argument('--fullscreen', action='store_true', help='fill the screen (F11 switches at any time)')
+    args = parser.parse_args()
+    width, height = (int(n) for n in args.size.lower().split('x'))
+    if args.profile:
+        profiler.enable()
+    bus.add_sink(ConsoleSink(), DEBUG)  # the console shows everything, as it always has
+    flags = pygame.FULLSCREEN if args.fullscreen else pygame.RESIZABLE
+    game = WarGame(0 if args.fullscreen else width, 0 if args.fullscreen else height, autoplay=args.autoplay, fps=args.fps, event_driven=not args.poll, flags=flags)
+    game.windowed_size = (width, height)
     game.run()
\ No newline at end of file
@@ -0,0 +1,111 @@
+import argparse
+import mmap
+import os
+import struct
+import pygame
+from engine import SUITS
+from eventlog import bus
+
+# Pre-decoded card images. Building the pack decodes every card JPEG once and stores
+# the raw RGB pixels in one file:
+#   magic, version (u32), image count (u32)
+#   per image: name length (u16), name (utf-8), width (u16), height (u16), offset (u64)
+#   the pixels of every image, rows top to bottom
+# At launch the file is memory-mapped and every image becomes a pygame surface over
+# the mapped bytes with frombuffer: one open, no decoding and no copies until the
+# surfaces are drawn. Names are the paths the images were built from, so a pack can
+# stand in for the loose files one by one.
+#
+#   python assetpack.py              build cards.pack from cards/
+#
+# Rebuild the pack after changing anything in cards/.
+
+MAGIC = b'WARPACK\0'
+VERSION = 1
+PIXEL_FORMAT = 'RGB'
+BYTES_PER_PIXEL = 3
+DEFAULT_PATH = 'cards.pack'
+
+def card_paths(values=range(2, 15)):
+    return ['cards/TOP.jpg'] + [f'cards/{suit}{value}.jpg' for suit in SUITS for value in values]
+
+def build(paths, out_path=DEFAULT_PATH):
+    images = [(path, pygame.image.load(path)) for path in paths]
+    names = [path.encode() for path, image in images]
+    offset = len(MAGIC) + 8 + sum(2 + len(name) + 12 for name in names)
+    table = bytearray()
+    pixels = []
+    for name, (path, image) in zip(names, images):
+        width, height = image.get_size()
+        table += struct.pack('<H', len(name)) + name + struct.pack('<HHQ', width, height, offset)
+        pixels.append(pygame.image.tobytes(image, PIXEL_FORMAT))
+        offset += len(pixels[-1])
+    temporary = out_path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', VERSION, len(names)))
+        f.write(table)
+        f.writelines(pixels)
+    os.replace(temporary, out_path)  # never leave half a pack where the game looks for it
+
+class AssetPack:
+    def __init__(self, path=DEFAULT_PATH):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f'{path} is empty')
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # the mapping outlives the file object
+        try:
+            self.entries = self.read_entries()  # name -> (width, height, offset)
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            self.data.close()
+            raise ValueError(f'{path} is not a usable asset pack: {e}')
+
+    def read_entries(self):
+        data = self.data
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('wrong magic')
+        version, count = struct.unpack_from('<II', data, len(MAGIC))
+        if version != VERSION:
+            raise ValueError(f'version {version}, expected {VERSION}')
+        entries = {}
+        pos = len(MAGIC) + 8
+        for _ in range(count):
+            length, = struct.unpack_from('<H', data, pos)
+            name = data[pos + 2:pos + 2 + length].decode()
+            width, height, offset = struct.unpack_from('<HHQ', data, pos + 2 + length)
+            if offset + width * height * BYTES_PER_PIXEL > len(data):
+                raise ValueError(f'{name} runs past the end of the file')
+            entries[name] = (width, height, offset)
+            pos += 2 + length + 12
+        return entries
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def image(self, name):
+        width, height, offset = self.entries[name]
+        pixels = memoryview(self.data)[offset:offset + width * height * BYTES_PER_PIXEL]
+        return pygame.image.frombuffer(pixels, (width, height), PIXEL_FORMAT)
+
+    def close(self):
+        self.data.close()
+
+# The pack at path, or None if there is none or it can't be used, in which case the loose files are loaded instead
+def open_pack(path=DEFAULT_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return AssetPack(path)
+    except (OSError, ValueError) as e:
+        bus.warning('assets.bad_pack', 'Not using the asset pack: {error}', error=e)
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack the card images pre-decoded into one file.')
+    parser.add_argument('--out', default=DEFAULT_PATH)
+    args = parser.parse_args()
+    paths = card_paths()
+    build(paths, args.out)
+    print(f'Packed {len(paths)} images into {args.out} ({os.path.getsize(args.out):,} bytes)')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import numpy as np
+from engine import Deck
+
+# Plays many independent War games in lockstep. Every game follows the same rules
+# as WarEngine.step(), but the state of all games lives in integer arrays and each
+# round is a handful of vectorized operations over the games that are still running.
+#
+# Cards are stored by value only; suits never matter to the rules. Hands are stacks
+# whose top is at hand_len - 1. Won piles are always shuffled before they are played
+# and the pot always ends up on a won pile, so both only keep a count per value.
+class BatchWar:
+    def __init__(self, games, seed=None, deck=None):
+        self.rng = np.random.default_rng(seed)
+        values = np.array([card.value for card in (deck or Deck()).cards], dtype=np.int8)
+        self.card_count = card_count = len(values)
+        self.columns = np.arange(card_count)
+        self.value_count = values.max() + 1
+        self.values = np.arange(self.value_count, dtype=np.int8)
+
+        # Shuffle every deck and deal it like WarEngine.deal_cards: pop from the end, player 1 first
+        order = np.argsort(self.rng.random((games, card_count)), axis=1)
+        dealt = values[order][:, ::-1]
+        self.hand = np.zeros((2, games, card_count), np.int8)
+        self.hand[0, :, :card_count // 2] = dealt[:, 0::2]
+        self.hand[1, :, :card_count // 2] = dealt[:, 1::2]
+        self.hand_len = np.full((2, games), card_count // 2, np.intp)
+        self.won = np.zeros((2, games, self.value_count), np.int8)
+        self.won_len = np.zeros((2, games), np.intp)
+        self.pot = np.zeros((games, self.value_count), np.int8)
+
+        self.rounds = np.zeros(games, np.int32)
+        self.wars = np.zeros(games, np.int32)  # war iterations, like RoundResult.wars
+        self.winners = np.zeros(games, np.int8)  # 0 while running or unfinished, else 1 or 2
+        self.games = np.arange(games)  # game number of each state row
+        self.active = np.arange(games)  # state rows of the games still being played
+        self.results = {'rounds': np.zeros(games, np.int32), 'wars': np.zeros(games, np.int32), 'winners': self.winners}
+
+    # Take the top card of player p in each game of rows, reshuffling emptied hands
+    def pop(self, p, rows):
+        top = self.hand_len[p, rows] - 1
+        cards = self.hand[p, rows, top]
+        self.hand_len[p, rows] = top
+        empty = rows[(top == 0) & (self.won_len[p, rows] > 0)]
+        if len(empty):
+            self.reshuffle(p, empty)
+        return cards
+
+    # Turn the won piles of player p into freshly shuffled hands
+    def reshuffle(self, p, rows):
+        counts = self.won_len[p, rows]
+        # lay the won cards out in value order, then shuffle them with random sort keys
+        won = self.won[p, rows]
+        cards = np.zeros((len(rows), self.card_count), np.int8)
+        cards[self.columns < counts[:, None]] = np.repeat(np.tile(self.values, len(rows)), won.ravel())
+        keys = self.rng.random((len(rows), self.card_count))
+        keys[self.columns >= counts[:, None]] = 2.0  # empty slots sort after the real cards
+        order = np.argsort(keys, axis=1)
+        self.hand[p, rows] = np.take_along_axis(cards, order, axis=1)
+        self.hand_len[p, rows] = counts
+        self.won[p, rows] = 0
+        self.won_len[p, rows] = 0
+
+    def push(self, rows, cards):
+        self.pot[rows, cards] += 1
+
+    # Move the whole pot onto the won pile of player p
+    def award(self, p, rows):
+        if not len(rows):
+            return
+        pot = self.pot[rows]
+        self.won[p, rows] += pot
+        self.won_len[p, rows] += pot.sum(axis=1, dtype=np.intp)
+        self.pot[rows] = 0
+
+    # Player p adds a card to the pot, or forfeits it to the opponent when out of cards
+    def play_or_forfeit(self, p, rows):
+        short = self.hand_len[p, rows] == 0
+        self.award(1 - p, rows[short])
+        rows = rows[~short]
+        cards = self.pop(p, rows)
+        self.push(rows, cards)
+        return rows, cards, ~short
+
+    def step(self):
+        rows = self.active
+        if not len(rows):
+            return 0
+        self.rounds[rows] += 1
+
+        # A player who cannot play a battle card loses the game straight away
+        player2_win = self.hand_len[0, rows] == 0
+        player1_win = ~player2_win & (self.hand_len[1, rows] == 0)
+        battle = rows[~(player1_win | player2_win)]
+
+        card1 = self.pop(0, battle)
+        card2 = self.pop(1, battle)
+        self.push(battle, card1)
+        self.push(battle, card2)
+        self.award(0, battle[card1 > card2])
+        self.award(1, battle[card1 < card2])
+        tied = card1 == card2
+        war = battle[tied]
+        if len(war):
+            # only the cards that caused the war stay in the pot
+            self.pot[war] = 0
+            self.push(war, card1[tied])
+            self.push(war, card2[tied])
+            self.resolve_war(war)
+
+        total = self.hand_len[:, rows] + self.won_len[:, rows]
+        winners = np.where((total[0] == self.card_count) | player1_win, 1,
+                           np.where((total[1] == self.card_count) | player2_win, 2, 0))
+        self.winners[self.games[rows]] = winners
+        self.active = rows[winners == 0]
+        if len(self.active) < len(self.games) // 2:
+            self.compact()
+        return len(self.active)
+
+    # Drop the state rows of finished games so later rounds touch less memory
+    def compact(self):
+        finished = np.ones(len(self.games), bool)
+        finished[self.active] = False
+        self.results['rounds'][self.games[finished]] = self.rounds[finished]
+        self.results['wars'][self.games[finished]] = self.wars[finished]
+        rows = self.active
+        self.hand = self.hand[:, rows]
+        self.hand_len = self.hand_len[:, rows]
+        self.won = self.won[:, rows]
+        self.won_len = self.won_len[:, rows]
+        self.pot = self.pot[rows]
+        self.rounds = self.rounds[rows]
+        self.wars = self.wars[rows]
+        self.games = self.games[rows]
+        self.active = np.arange(len(rows))
+
+    def resolve_war(self, war):
+        t = 2
+        while t and len(war):
+            t -= 1
+            self.wars[war] += 1
+            for _ in range(3):  # place three cards face down
+                war = self.play_or_forfeit(0, war)[0]
+                war = self.play_or_forfeit(1, war)[0]
+            # add one more card face up from each player
+            war, card1, _ = self.play_or_forfeit(0, war)
+            war, card2, played = self.play_or_forfeit(1, war)
+            card1 = card1[played]
+            self.award(0, war[card1 > card2])
+            self.award(1, war[card1 < card2])
+            war = war[card1 == card2]
+        # games still tied after both iterations carry the pot over to the next round
+
+    def run(self, max_rounds=None):
+        rounds = 0
+        while len(self.active) and (max_rounds is None or rounds < max_rounds):
+            self.step()
+            rounds += 1
+        self.results['rounds'][self.games] = self.rounds
+        self.results['wars'][self.games] = self.wars
+        return self.results
+
+# Play games in chunks so memory stays bounded, returning per-game arrays
+def simulate(games, seed=None, chunk_size=100000, max_rounds=10000, deck=None):
+    rng = np.random.default_rng(seed)
+    results = {'rounds': [], 'wars': [], 'winners': []}
+    while games > 0:
+        size = min(games, chunk_size)
+        chunk = BatchWar(size, seed=rng.integers(2 ** 63), deck=deck).run(max_rounds)
+        for key in results:
+            results[key].append(chunk[key])
+        games -= size
+    return {key: np.concatenate(arrays) for key, arrays in results.items()}
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # no window needed, must be set before pygame starts
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+import assetpack
+from engine import MultiWarEngine, WarEngine
+from War import CardImages, WarGame
+from test import GameObject, Room, TextRectangle, textCache
+
+# Benchmarks for the engine, the drawing code and the asset paths.
+#
+#   python bench.py                           run everything and print the results
+#   python bench.py --save baseline.json      ... and keep them as a baseline
+#   python bench.py --compare baseline.json   fail if anything got slower than --threshold
+#
+# Every benchmark returns a function that does some work and says how many
+# operations it did. The runner calls it until --min-time has passed, keeps the
+# best of --repeat runs and reports seconds per operation.
+
+BENCHMARKS = {}  # name -> (unit, setup)
+
+def benchmark(name, unit):
+    def register(setup):
+        BENCHMARKS[name] = (unit, setup)
+        return setup
+    return register
+
+class Context:
+    def __init__(self):
+        self.game = WarGame(800, 600)
+        self.rng = random.Random(1)
+        self.temporary = tempfile.TemporaryDirectory()  # removed when the run ends
+
+    def new_game(self):
+        self.game.new_game(WarEngine('Opponent', 'You', rng=self.rng))
+
+@benchmark('engine_rounds', 'round')
+def engine_rounds(context):
+    def run():
+        engine = WarEngine(rng=context.rng)
+        engine.play_to_completion(max_rounds=5000)
+        return engine.rounds
+    return run
+
+# Rounds at a table of players seats, to see how the cost of a round grows with the table
+def multi_engine_rounds(players):
+    def setup(context):
+        def run():
+            engine = MultiWarEngine(players, rng=context.rng)
+            engine.play_to_completion(max_rounds=5000)
+            return engine.rounds
+        return run
+    return setup
+
+for players in (2, 4, 8):
+    benchmark(f'multi_engine_rounds_{players}', 'round')(multi_engine_rounds(players))
+
+@benchmark('play_round', 'click')
+def play_round(context):
+    context.new_game()
+    game = context.game
+
+    def run():
+        for _ in range(100):
+            if game.engine.winner is not None:
+                context.new_game()
+            game.play_round()
+        return 100
+    return run
+
+# The war cards a war of the given number of iterations puts on the table
+def war_layout(game, depth):
+    hand1, hand2 = list(game.player1.hand), list(game.player2.hand)
+    plays = [(game.player1, hand1.pop(), 'battle'), (game.player2, hand2.pop(), 'battle')]
+    for _ in range(depth):
+        for kind in ('down', 'down', 'down', 'up'):
+            plays.append((game.player1, hand1.pop(), kind))
+            plays.append((game.player2, hand2.pop(), kind))
+    for player, card, kind in plays:
+        card.face_up = kind != 'down'
+    return plays
+
+def draw_cards_at_depth(depth):
+    def setup(context):
+        context.new_game()
+        game = context.game
+        layout = war_layout(game, depth)
+
+        def run():  # every other call clears the war, so each draw has work to do
+            for war in (True, False):
+                game.war = war
+                game.war_cards = layout if war else []
+                game.draw_cards(draw_new=not war)
+            return 2
+        return run
+    return setup
+
+for depth in (0, 1, 2):
+    benchmark(f'draw_cards_war_depth_{depth}', 'draw')(draw_cards_at_depth(depth))
+
+@benchmark('sprite_image_cold', 'image')
+def sprite_image_cold(context):
+    game = context.game
+
+    def run():  # decode from disk
+        game.makeSpriteImage('cards/HEARTS12.jpg')
+        return 1
+    return run
+
+@benchmark('sprite_image_warm', 'image')
+def sprite_image_warm(context):
+    context.new_game()
+    cards = list(context.game.player1.hand)
+    card_images = context.game.card_images
+
+    def run():  # served from the atlas
+        for card in cards:
+            card_images.get(card)
+        return len(cards)
+    return run
+
+@benchmark('card_images_loose', 'build')
+def card_images_loose(context):
+    def run():  # decode every JPEG
+        CardImages(context.game)
+        return 1
+    return run
+
+@benchmark('card_images_packed', 'build')
+def card_images_packed(context):
+    path = os.path.join(context.temporary.name, 'cards.pack')
+    assetpack.build(assetpack.card_paths(), path)
+
+    def run():  # map the pack and wrap it
+        CardImages(context.game, pack=assetpack.AssetPack(path))
+        return 1
+    return run
+
+@benchmark('card_images_scale_4k', 'size')
+def card_images_scale_4k(context):
+    card_images = CardImages(context.game)
+    size = (270, 360)  # the cards on a 3840x2160 window
+
+    def run():  # smoothscale every card once, as a resize to a new size does
+        card_images.sizes.pop(size, None)
+        card_images.set_size(size)
+        return 1
+    return run
+
+def set_text(cached):
+    def setup(context):
+        label = TextRectangle('', 100, 40, context.game.font, (255, 255, 255))
+        texts = [f'You: {count} cards left' for count in range(53)]
+
+        def run():
+            if not cached:
+                textCache.clear()
+            for text in texts:
+                label.setText(text)
+            return len(texts)
+        return run
+    return setup
+
+benchmark('set_text_cached', 'call')(set_text(True))
+benchmark('set_text_uncached', 'call')(set_text(False))
+
+@benchmark('frame_full', 'frame')
+def frame_full(context):
+    context.new_game()
+    game = context.game
+    game.war = True
+    game.war_cards = war_layout(game, 2)
+    game.draw_cards()
+
+    def run():
+        game.room.updateObjects()
+        game.room.renderBackground(game)
+        game.room.renderObjects(game)
+        pygame.display.flip()
+        return 1
+    return run
+
+# A room with a thousand cards spread over the window, as a busy table in a game with many players would have
+def crowded_room(context):
+    context.new_game()
+    room = Room('bench', context.game.makeBackground((0, 0, 0)))
+    image = context.game.card_images.get(context.game.engine.player1.hand[0])
+    rng = random.Random(1)
+    for _ in range(1000):
+        card = GameObject(image)
+        card.rect.topleft = (rng.randrange(800), rng.randrange(600))
+        room.addObject(card)
+    return room, rng
+
+@benchmark('what_got_clicked', 'click')
+def what_got_clicked(context):
+    room, rng = crowded_room(context)
+    clicks = [(rng.randrange(800), rng.randrange(600)) for _ in range(100)]
+
+    def run():
+        for pos in clicks:
+            room.whatGotClicked(pos)
+        return len(clicks)
+    return run
+
+@benchmark('get_collisions', 'call')
+def get_collisions(context):
+    room, rng = crowded_room(context)
+    cards = rng.sample(room.roomObjects.sprites(), 20)
+
+    def run():
+        for card in cards:
+            room.getCollisions(card)
+        return len(cards)
+    return run
+
+# Best seconds per operation over repeat runs of at least min_time each
+def measure(run, repeat, min_time):
+    best = float('inf')
+    for _ in range(repeat):
+        operations = 0
+        start = time.perf_counter()
+        while True:
+            operations += run()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / operations)
+    return best
+
+def run_benchmarks(names, repeat=5, min_time=0.2):
+    context = Context()
+    results = {}
+    for name in names:
+        unit, setup = BENCHMARKS[name]
+        seconds = measure(setup(context), repeat, min_time)
+        results[name] = {'unit': unit, 'seconds_per_op': seconds, 'ops_per_sec': 1.0 / seconds}
+    return results
+
+# Names of the benchmarks that got slower than the baseline by more than threshold (0.2 is 20%)
+def regressions(results, baseline, threshold):
+    slower = []
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if before is not None and result['seconds_per_op'] > before['seconds_per_op'] * (1 + threshold):
+            slower.append(name)
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the War engine, drawing and assets.')
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per run')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown that counts as a regression, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    save = args.save and os.path.abspath(args.save)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # the card images are loaded by relative path
+    results = run_benchmarks(args.names or list(BENCHMARKS), args.repeat, args.min_time)
+
+    for name, result in results.items():
+        line = f"{name:26} {result['ops_per_sec']:14,.1f} {result['unit']}s/s"
+        before = baseline and baseline['results'].get(name)
+        if before:
+            line += f"   {before['seconds_per_op'] / result['seconds_per_op'] - 1:+7.1%} ops/s vs baseline"
+        print(line)
+
+    if save:
+        with open(save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'pygame': pygame.version.ver, 'machine': platform.machine(),
+                       'platform': platform.platform(), 'results': results}, f, indent=2)
+    if baseline is not None:
+        slower = regressions(results, baseline, args.threshold)
+        if slower:
+            print(f"Slower than the baseline by more than {args.threshold:.0%}: {', '.join(slower)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
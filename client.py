@@ -0,0 +1,114 @@
+import argparse
+import json
+import socket
+from engine import Card, Player, RoundResult
+
+# Thin client for server.py. RemoteEngine has the WarEngine interface that WarGame
+# uses, but every round is played by the server, so the window only draws.
+
+class Connection:
+    # address is 'host:port' or the path of a Unix socket
+    def __init__(self, address):
+        if ':' in address:
+            host, port = address.rsplit(':', 1)
+            self.socket = socket.create_connection((host, int(port)))
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, op, **fields):
+        self.file.write(json.dumps(dict(fields, op=op), separators=(',', ':')).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('the server closed the connection')
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+class RemoteEngine:
+    def __init__(self, connection, seed=None, player1_name='Opponent', player2_name='You'):
+        self.connection = connection
+        self.player1 = Player(player1_name)
+        self.player2 = Player(player2_name)
+        self.cards = {}  # code -> Card, so the same card stays the same object between rounds
+        self.cycle = None
+        reply = connection.request('new', seed=seed)
+        self.session = reply['session']
+        self.update(reply['state'])
+
+    def card(self, code):
+        card = self.cards.get(code)
+        if card is None:
+            card = self.cards[code] = Card.from_code(code)
+        return card
+
+    def player(self, number):
+        return {1: self.player1, 2: self.player2}.get(number)
+
+    def update(self, state):
+        for player, hand, won in zip((self.player1, self.player2), state['hands'], state['won']):
+            player.hand.clear()
+            player.hand.extend(self.card(code) for code in hand)
+            player.won_cards.clear()
+            player.won_cards.extend(self.card(code) for code in won)
+            for card in player.hand:
+                card.face_up = True
+        self.cards_in_play = [self.card(code) for code in state['pot']]
+        self.war = state['war']
+        self.rounds = state['rounds']
+        self.total_cards_played = state['total_cards_played']
+        self.card_count = state['card_count']
+        self.winner = self.player(state['winner'])
+        self.player1_win = self.winner is self.player1
+        self.player2_win = self.winner is self.player2
+
+    def finished(self):
+        return self.winner is not None
+
+    def step(self, rounds=1):
+        reply = self.connection.request('step', session=self.session, rounds=rounds)
+        self.update(reply['state'])
+        encoded = reply['result']
+        result = RoundResult()
+        for number, code, kind in encoded['plays']:
+            card = self.card(code)
+            card.face_up = kind != 'down'
+            result.plays.append((self.player(number), card, kind))
+        result.war = encoded['war']
+        result.wars = encoded['wars']
+        result.short = self.player(encoded['short'])
+        result.round_winner = self.player(encoded['round_winner'])
+        result.game_winner = self.player(encoded['game_winner'])
+        return result
+
+    def play_to_completion(self, max_rounds=None):
+        while not self.finished() and (max_rounds is None or self.rounds < max_rounds):
+            self.step()
+        return self.winner
+
+    def close(self):
+        self.connection.request('close', session=self.session)
+
+def main():
+    parser = argparse.ArgumentParser(description='Play War on a server.py server.')
+    parser.add_argument('--connect', default='127.0.0.1:8765', help="'host:port' or the path of a Unix socket")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    from War import WarGame
+    from eventlog import bus, ConsoleSink, DEBUG
+    bus.add_sink(ConsoleSink(), DEBUG)
+    connection = Connection(args.connect)
+    try:
+        WarGame(800, 600, engine=RemoteEngine(connection, args.seed)).run()
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
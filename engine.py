@@ -0,0 +1,570 @@
+import copy
+import random
+from array import array
+from collections import deque
+from eventlog import bus
+
+# Pure-Python War rules. Nothing in here may import pygame so the engine can be
+# used for bulk simulation without a display; War.py drives it for rendering.
+# Messages go to eventlog.bus, which drops them unless a sink is attached.
+
+SUITS = ('CLUBS', 'DIAMONDS', 'HEARTS', 'SPADES')
+
+# Cards are slotted so thousands of resident games stay small. Each card also
+# carries a compact int code (suit index in the high bits, value in the low 4)
+# that fits in a byte and can stand in for the card in arrays and traces.
+class Card:
+    __slots__ = ('suit', 'value', 'face_up', 'code')
+
+    def __init__(self, suit, value):
+        self.suit = suit
+        self.value = value
+        self.face_up = False  # track whether the card is face up or face down
+        self.code = SUITS.index(suit) << 4 | value
+
+    @classmethod
+    def from_code(cls, code):
+        return cls(SUITS[code >> 4], code & 0xF)
+
+# rng is anything with a shuffle() method, the random module by default. Pass a
+# random.Random to make a game reproducible without touching the global state.
+# ranks and copies give smaller (or bigger) decks: values run from 2 up to ranks + 1
+# and every value comes in copies suits, suits repeating past the fourth copy.
+class Deck:
+    def __init__(self, rng=random, ranks=13, copies=4):
+        if not 1 <= ranks <= 14:
+            raise ValueError(f'ranks must be between 1 and 14, got {ranks}')  # values have to fit in the low 4 bits of Card.code
+        if copies < 1:
+            raise ValueError(f'copies must be at least 1, got {copies}')
+        self.cards = []
+        self.rng = rng
+        self.ranks = ranks
+        self.copies = copies
+        self.populate()
+
+    def populate(self):
+        suits = [SUITS[copy % len(SUITS)] for copy in range(self.copies)]
+        values = range(2, 2 + self.ranks)  # values from 2 to 14 for a full deck, where 14 represents the ace
+        for value in values[:3]:
+            for suit in suits:
+                self.cards.append(Card(suit, value))
+        
+        for suit in suits:
+            for value in values[3:]:
+                self.cards.append(Card(suit, value))
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+        for card in self.cards:  # Ensure all cards are face up after shuffling
+            card.face_up = True
+
+    def deal(self):
+        return self.cards.pop() if self.cards else None
+
+# The top of the hand is the right end of the deque, so taking and giving cards is O(1).
+# With shuffle_won=False won cards come back into the hand in the order they were won,
+# which makes the game deterministic after the deal.
+class Player:
+    def __init__(self, name, rng=random, shuffle_won=True):
+        self.name = name
+        self.rng = rng
+        self.shuffle_won = shuffle_won
+        self.shuffles = 0  # times the won pile was picked up as the new hand
+        self.hand = deque()
+        self.won_cards = deque()
+
+    def take_card(self, card):
+        self.hand.append(card)
+
+    def win_cards(self, cards):
+        self.won_cards.extend(cards)
+
+    def play_card(self, face_up=True):
+        if self.hand:
+            card = self.hand.pop()
+            if card == None:
+                return None
+            card.face_up = face_up  # specify whether the card is face up or face down
+            if not self.hand and self.won_cards:  # reshuffle won cards if hand is empty
+                bus.info('player.reshuffle', 'Reshuffling cards!', player=self.name)
+                self.hand = self.won_cards
+                self.won_cards = deque()
+                self.shuffle_hand()
+            return card
+        if not self.hand and self.won_cards:
+            bus.info('player.reshuffle', 'Reshuffling cards!', player=self.name)
+            self.hand = self.won_cards
+            self.won_cards = deque()
+            self.shuffle_hand()
+        bus.info('player.out_of_cards', 'No cards left in hand!', player=self.name)
+        return None
+
+    def place_card_face_down(self):
+        return self.play_card(False)  # the card is face down
+
+    def shuffle_hand(self):
+        cards = list(self.hand)  # shuffling a list avoids O(n) deque indexing
+        self.shuffles += 1
+        if self.shuffle_won:
+            self.rng.shuffle(cards)
+        for card in cards:  # Ensure all cards are face up after shuffling
+            card.face_up = True
+        self.hand = deque(cards)
+
+    def card_total(self):
+        return len(self.hand) + len(self.won_cards)
+
+# State hashing for cycle detection. A pile hashes as a polynomial over its card
+# codes, so appending a card is O(1) and a hand keeps the hash of every prefix,
+# which makes taking the top card O(1) as well.
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 0x9E3779B97F4A7C15 % HASH_MODULUS
+
+def extend_hash(pile_hash, card):
+    return (pile_hash * HASH_BASE + card.code) % HASH_MODULUS
+
+# A Player that keeps the hashes of its hand and won pile up to date as cards move
+class HashedPlayer(Player):
+    def __init__(self, name, rng=random, shuffle_won=True):
+        super().__init__(name, rng, shuffle_won)
+        self.hand_hashes = [0]  # hand_hashes[i] is the hash of the bottom i cards of the hand
+        self.won_hash = 0
+
+    def take_card(self, card):
+        super().take_card(card)
+        self.hand_hashes.append(extend_hash(self.hand_hashes[-1], card))
+
+    def win_cards(self, cards):
+        super().win_cards(cards)
+        for card in cards:
+            self.won_hash = extend_hash(self.won_hash, card)
+
+    def play_card(self, face_up=True):
+        card = super().play_card(face_up)
+        del self.hand_hashes[len(self.hand) + 1:]
+        return card
+
+    def shuffle_hand(self):
+        super().shuffle_hand()
+        self.rehash()  # the won pile has just become the hand
+
+    # Recompute both hashes from the piles, after they were replaced wholesale
+    def rehash(self):
+        self.hand_hashes = [0]
+        for card in self.hand:
+            self.hand_hashes.append(extend_hash(self.hand_hashes[-1], card))
+        self.won_hash = 0
+        for card in self.won_cards:
+            self.won_hash = extend_hash(self.won_hash, card)
+
+    def state_hash(self):
+        return (self.hand_hashes[len(self.hand)], self.won_hash)
+
+# Remembers state hashes and the round they were first seen at. When it is full it
+# starts over, so memory stays bounded and any cycle shorter than max_states is
+# still caught the next time it comes around.
+class StateTable:
+    def __init__(self, max_states=100000):
+        self.max_states = max_states
+        self.states = {}
+        self.resets = 0
+
+    # Returns the round the state was first seen at, or records it and returns None
+    def seen(self, state, round):
+        first = self.states.get(state)
+        if first is not None:
+            return first
+        if len(self.states) >= self.max_states:
+            self.states.clear()
+            self.resets += 1
+        self.states[state] = round
+        return None
+
+    # Drop the states first seen after round, e.g. when the game goes back to it
+    def forget_after(self, round):
+        self.states = {state: first for state, first in self.states.items() if first <= round}
+
+    def copy(self):
+        table = StateTable(self.max_states)
+        table.states = dict(self.states)
+        table.resets = self.resets
+        return table
+
+# Everything needed to put a WarEngine back the way it was. Piles are arrays of indexes
+# into the engine's own cards, a byte each for decks of up to 256 cards, so taking a
+# snapshot copies at most a few dozen bytes per pile and no Card objects. The random
+# generator's state is included.
+class EngineSnapshot:
+    __slots__ = ('hands', 'won', 'pot', 'face_up', 'shuffles', 'war', 'rounds', 'total_cards_played',
+                 'player1_win', 'player2_win', 'winner', 'cycle', 'rng_state')
+
+# What happened during one WarEngine.step(), so a front end can show it afterwards
+class RoundResult:
+    def __init__(self):
+        self.plays = []  # (player, card, kind) in table order, kind is 'battle', 'down' or 'up'
+        self.war = False  # whether the battle cards tied
+        self.wars = 0  # number of war iterations started (at most 2 per round)
+        self.short = None  # player who ran out of cards in the middle of a war
+        self.round_winner = None  # player who took the pot, None if nobody did
+        self.game_winner = None  # set once the game is over
+        self.cycle = None  # (round, period) if this round repeated an earlier state
+        self.reshuffles = []  # (player, new hand as a list, bottom to top) for every reshuffle this round
+
+# What every War engine has: the deck, dealt round robin to players in seat order, the
+# pot and the counters. Subclasses write the rules in step() and decide when the game
+# is over. replay_after_reshuffle plays again for a player whose hand ran out but who
+# picked up their won pile in doing so; without it the player shows no card, which is
+# how the two-player game has always ended when the last card of a hand was won.
+class BaseWarEngine:
+    replay_after_reshuffle = False
+
+    def __init__(self, players, rng=random, ranks=13, copies=4):
+        self.rng = rng
+        self.players = players  # in seat order
+        self.deck = Deck(rng, ranks, copies)
+        self.deck.shuffle()
+        self.card_count = len(self.deck.cards)
+        self.cards = list(self.deck.cards)  # every card of the game, the deck is empty once dealt
+        self.card_index = {card: i for i, card in enumerate(self.cards)}
+        self.cards_in_play = []
+        self.war = False
+        self.total_cards_played = 0  # Initialize total cards played
+        self.rounds = 0
+        self.winner = None
+
+    # Round robin from the first seat, so with an uneven split the first seats get a card more
+    def deal_cards(self):
+        seats = len(self.players)
+        total_cards_dealt = 0
+        while self.deck.cards:
+            card = self.deck.deal()
+            card.face_up = True  # Set the initial deal to face-up
+            self.players[total_cards_dealt % seats].take_card(card)
+            total_cards_dealt += 1
+        bus.info('engine.deal', 'Total cards dealt: {total_cards_dealt}', total_cards_dealt=total_cards_dealt)
+
+    def award(self, player, result):
+        player.win_cards(self.cards_in_play)
+        self.cards_in_play = []
+        self.war = False
+        result.round_winner = player
+
+    # Player.play_card, noting the new hand in the result if the player had to reshuffle
+    def take_card(self, player, face_up, result):
+        shuffles = player.shuffles
+        card = player.play_card(face_up)
+        if player.shuffles != shuffles:
+            result.reshuffles.append((player, list(player.hand)))
+        if card is None and player.hand and self.replay_after_reshuffle:
+            card = self.take_card(player, face_up, result)
+        return card
+
+    def play(self, player, face_up, kind, result):
+        card = self.take_card(player, face_up, result)
+        result.plays.append((player, card, kind))
+        self.cards_in_play.append(card)
+        self.total_cards_played += 1  # Increase total cards played by 1
+        return card
+
+    def finished(self):
+        return self.winner is not None
+
+    def play_to_completion(self, max_rounds=None):
+        while not self.finished() and (max_rounds is None or self.rounds < max_rounds):
+            self.step()
+        return self.winner
+
+# detect_cycles hashes the game state after every round and ends the game, with
+# no winner, as soon as a state repeats. Repeats need a deterministic game, that is
+# shuffle_won=False: with shuffling the random generator's position is part of the
+# state and it never comes back.
+class WarEngine(BaseWarEngine):
+    def __init__(self, player1_name='Opponent', player2_name='You', rng=random, shuffle_won=True, detect_cycles=False, max_states=100000, ranks=13, copies=4):
+        if ranks * copies % 2:
+            raise ValueError(f'the deck has to split evenly between two players, got {ranks * copies} cards')
+        player_class = HashedPlayer if detect_cycles else Player
+        self.player1 = player_class(player1_name, rng, shuffle_won)
+        self.player2 = player_class(player2_name, rng, shuffle_won)
+        super().__init__([self.player1, self.player2], rng, ranks, copies)
+        self.seen_states = StateTable(max_states) if detect_cycles else None
+        self.cycle = None  # (round first seen, period) once the game has repeated itself
+        self.player1_win = False
+        self.player2_win = False
+        self.deal_cards()
+        if self.seen_states is not None:
+            self.seen_states.seen(self.state_hash(), 0)
+
+    def check_winner(self, result):
+        if self.player1.card_total() == self.card_count or self.player1_win:
+            self.winner = self.player1
+        elif self.player2.card_total() == self.card_count or self.player2_win:
+            self.winner = self.player2
+        result.game_winner = self.winner
+
+    def finished(self):
+        return super().finished() or self.cycle is not None
+
+    # Hash of both hands, both won piles, the pot and how far the random generator has got
+    def state_hash(self):
+        pot = tuple(card.code for card in self.cards_in_play)
+        rng_position = self.player1.shuffles + self.player2.shuffles if self.player1.shuffle_won else 0
+        return hash((self.player1.state_hash(), self.player2.state_hash(), pot, rng_position))
+
+    def check_cycle(self, result):
+        first = self.seen_states.seen(self.state_hash(), self.rounds)
+        if first is not None:
+            self.cycle = (first, self.rounds - first)
+            result.cycle = self.cycle
+
+    # Play one round: a battle and, on a tie, up to two war iterations
+    def step(self):
+        result = RoundResult()
+        if self.finished():
+            result.game_winner = self.winner
+            result.cycle = self.cycle
+            return result
+        self.rounds += 1
+        card1 = self.take_card(self.player1, True, result)
+        card2 = self.take_card(self.player2, True, result)
+        if card1 == None:
+            self.player1_win = False
+            self.player2_win = True
+        elif card2 == None:
+            self.player1_win = True
+            self.player2_win = False
+        else:
+            result.plays.append((self.player1, card1, 'battle'))
+            result.plays.append((self.player2, card2, 'battle'))
+            self.cards_in_play.extend([card1, card2])
+            self.total_cards_played += 2  # Increase total cards played by 2
+            if card1.value > card2.value:
+                self.award(self.player1, result)
+            elif card1.value < card2.value:
+                self.award(self.player2, result)
+            else:
+                self.resolve_war(result)
+        self.check_winner(result)
+        if self.seen_states is not None and self.winner is None:
+            self.check_cycle(result)
+        return result
+
+    def resolve_war(self, result):
+        result.war = True
+        self.war = True
+        self.cards_in_play = [self.cards_in_play[-2], self.cards_in_play[-1]]  # only the cards that caused the war stay in the pot
+        t = 2
+        while t:
+            t -= 1
+            result.wars += 1
+            for _ in range(3):  # place three cards face down
+                for player, opponent in ((self.player1, self.player2), (self.player2, self.player1)):
+                    if not player.hand:  # player doesn't have enough cards to complete the war
+                        result.short = player
+                        self.award(opponent, result)
+                        return
+                    self.play(player, False, 'down', result)
+            # add one more card face up from each player
+            face_up_cards = []
+            for player, opponent in ((self.player1, self.player2), (self.player2, self.player1)):
+                if not player.hand:
+                    result.short = player
+                    self.award(opponent, result)
+                    return
+                face_up_cards.append(self.play(player, True, 'up', result))
+            card1, card2 = face_up_cards
+            # Determine the winner of the war
+            if card1.value > card2.value:
+                self.award(self.player1, result)
+                return
+            elif card1.value < card2.value:
+                self.award(self.player2, result)
+                return
+        # still tied after both iterations: the pot carries over to the next round
+
+    def snapshot(self):
+        index = self.card_index
+        typecode = 'B' if len(self.cards) <= 256 else 'H'
+        pile = lambda cards: array(typecode, [index[card] for card in cards])
+        snapshot = EngineSnapshot()
+        snapshot.hands = (pile(self.player1.hand), pile(self.player2.hand))
+        snapshot.won = (pile(self.player1.won_cards), pile(self.player2.won_cards))
+        snapshot.pot = pile(self.cards_in_play)
+        snapshot.face_up = bytes(card.face_up for card in self.cards)
+        snapshot.shuffles = (self.player1.shuffles, self.player2.shuffles)
+        snapshot.war = self.war
+        snapshot.rounds = self.rounds
+        snapshot.total_cards_played = self.total_cards_played
+        snapshot.player1_win = self.player1_win
+        snapshot.player2_win = self.player2_win
+        snapshot.winner = 1 if self.winner is self.player1 else 2 if self.winner is self.player2 else 0
+        snapshot.cycle = self.cycle
+        snapshot.rng_state = self.rng.getstate() if hasattr(self.rng, 'getstate') else None
+        return snapshot
+
+    # Put the game back to a snapshot of this engine or of one forked from the same point.
+    # The players and the cards stay the same objects, so a WarGame showing the engine
+    # only needs to redraw. With cycle detection, states seen after the snapshot are forgotten.
+    def restore(self, snapshot):
+        cards = self.cards
+        for player, hand, won, shuffles in zip((self.player1, self.player2), snapshot.hands, snapshot.won, snapshot.shuffles):
+            player.hand = deque(cards[i] for i in hand)
+            player.won_cards = deque(cards[i] for i in won)
+            player.shuffles = shuffles
+            if isinstance(player, HashedPlayer):
+                player.rehash()
+        self.cards_in_play = [cards[i] for i in snapshot.pot]
+        for card, face_up in zip(cards, snapshot.face_up):
+            card.face_up = bool(face_up)
+        self.war = snapshot.war
+        self.rounds = snapshot.rounds
+        self.total_cards_played = snapshot.total_cards_played
+        self.player1_win = snapshot.player1_win
+        self.player2_win = snapshot.player2_win
+        self.winner = (None, self.player1, self.player2)[snapshot.winner]
+        self.cycle = snapshot.cycle
+        if snapshot.rng_state is not None:
+            self.rng.setstate(snapshot.rng_state)
+        if self.seen_states is not None:
+            self.seen_states.forget_after(snapshot.rounds)
+
+    # An independent copy of the game from here on, with its own cards and players.
+    # By default it gets its own random generator in the same state, so it plays the
+    # same future. Pass rng to make the fork's reshuffles come out differently; it has
+    # to be passed when the engine's generator can't tell its state.
+    def fork(self, rng=None):
+        snapshot = self.snapshot()
+        if rng is None and snapshot.rng_state is None:
+            raise ValueError(f'{type(self.rng).__name__} has no getstate(), so the fork can\'t play the same future; pass it an rng')
+        twin = copy.copy(self)
+        twin.cards = [Card(card.suit, card.value) for card in self.cards]
+        twin.card_index = {card: i for i, card in enumerate(twin.cards)}
+        twin.player1 = copy.copy(self.player1)
+        twin.player2 = copy.copy(self.player2)
+        twin.players = [twin.player1, twin.player2]
+        if self.seen_states is not None:
+            twin.seen_states = self.seen_states.copy()
+        twin.set_rng(random.Random())
+        twin.restore(snapshot)
+        if rng is not None:
+            twin.set_rng(rng)
+        return twin
+
+    def set_rng(self, rng):
+        self.rng = rng
+        self.player1.rng = rng
+        self.player2.rng = rng
+
+# 1 or 2 for a player of a two-player engine and 0 for None, as traces and the server store them
+def player_number(engine, player):
+    if player is None:
+        return 0
+    return 1 if player is engine.player1 else 2
+
+# What happened during one MultiWarEngine.step(). short is the first player who ran out in a war.
+class MultiRoundResult(RoundResult):
+    def __init__(self):
+        super().__init__()
+        self.tied = []  # players in each war iteration, the first entry are the ones whose battle cards tied
+        self.ran_out = []  # players who couldn't play all their war cards and dropped out of the war
+        self.eliminated = []  # players with no cards left at the start of the round
+
+# War for any number of players. Every player still in the game shows a battle card
+# and the highest card takes the pot. When several players tie for the highest card,
+# only they go to war: three cards down and one up each, again until one of them is
+# highest, at most max_wars times. A tied player without four cards left puts what
+# they have in the pot and drops out of the war. A pot nobody wins carries over to the next
+# round and goes to its winner. A player with no cards at the start of a round is out,
+# the last one holding cards wins. Everything is kept in one pot list and the players'
+# deques, so a round costs the same per player at any table size.
+class MultiWarEngine(BaseWarEngine):
+    replay_after_reshuffle = True  # e.g. after winning with their last card
+
+    def __init__(self, players=4, names=None, rng=random, shuffle_won=True, ranks=13, copies=4, max_wars=2):
+        if players < 2:
+            raise ValueError(f'War needs at least 2 players, got {players}')
+        names = names or [f'Player {i + 1}' for i in range(players)]
+        if len(names) != players:
+            raise ValueError(f'got {len(names)} names for {players} players')
+        super().__init__([Player(name, rng, shuffle_won) for name in names], rng, ranks, copies)
+        if self.card_count < players:
+            raise ValueError(f'{self.card_count} cards are not enough for {players} players')
+        self.active = list(self.players)  # players still in the game, in seat order
+        self.max_wars = max_wars
+        self.draw = False  # every card ended up in the pot, nobody can win
+        self.deal_cards()
+
+    # The players showing the highest card, in one pass over (player, card)
+    @staticmethod
+    def leaders(shown):
+        best = -1
+        leaders = []
+        for player, card in shown:
+            if card.value > best:
+                best = card.value
+                leaders = [player]
+            elif card.value == best:
+                leaders.append(player)
+        return leaders
+
+    def finished(self):
+        return super().finished() or self.draw
+
+    def check_winner(self, result):
+        holders = [player for player in self.active if player.hand or player.won_cards]
+        if len(holders) == 1:
+            if self.cards_in_play:  # nobody else can win the carried pot
+                self.award(holders[0], result)
+            self.winner = holders[0]
+        elif not holders:
+            self.draw = True
+        result.game_winner = self.winner
+
+    # Play one round: a battle between every player left and, on a tie, wars between the tied players
+    def step(self):
+        result = MultiRoundResult()
+        if self.finished():
+            result.game_winner = self.winner
+            return result
+        self.rounds += 1
+        active = []
+        for player in self.active:
+            if player.hand or player.won_cards:
+                active.append(player)
+            else:
+                result.eliminated.append(player)
+                bus.info('engine.eliminated', '{player} is out of cards', player=player.name)
+        self.active = active
+        shown = [(player, self.play(player, True, 'battle', result)) for player in active]
+        leaders = self.leaders(shown)
+        if len(leaders) == 1:
+            self.award(leaders[0], result)
+        else:
+            self.resolve_war(leaders, result)
+        self.check_winner(result)
+        return result
+
+    def resolve_war(self, tied, result):
+        result.war = True
+        self.war = True
+        for _ in range(self.max_wars):
+            result.wars += 1
+            result.tied.append(tied)
+            shown = []
+            for player in tied:
+                if player.card_total() < 4:  # not enough cards for the war, the ones left go to the pot anyway
+                    while player.card_total():
+                        self.play(player, False, 'down', result)
+                    result.ran_out.append(player)
+                    if result.short is None:
+                        result.short = player
+                    continue
+                for _ in range(3):
+                    self.play(player, False, 'down', result)
+                shown.append((player, self.play(player, True, 'up', result)))
+            if not shown:  # all of them ran out
+                return
+            tied = self.leaders(shown)
+            if len(tied) == 1:
+                self.award(tied[0], result)
+                return
+        # still tied after max_wars iterations: the pot carries over to the next round
@@ -0,0 +1,156 @@
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+
+# Leveled event bus for the engine and the game. Code emits events instead of printing,
+# sinks decide where they go. With no sink attached, or none that wants the level,
+# emit() returns after one comparison and messages are never formatted, so simulations
+# don't pay for logging they don't read. Guard anything expensive to compute with
+# bus.wants(level).
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+OFF = 100  # above every level
+
+class Event:
+    __slots__ = ('time', 'level', 'topic', 'message', 'fields')
+
+    def __init__(self, level, topic, message, fields):
+        self.time = time.time()
+        self.level = level
+        self.topic = topic  # dotted name of what happened, e.g. 'war.start'
+        self.message = message  # str.format template filled from fields
+        self.fields = fields
+
+    def text(self):
+        return self.message.format(**self.fields) if self.fields else self.message
+
+    def as_dict(self):
+        return {'time': self.time, 'level': LEVEL_NAMES.get(self.level, self.level), 'topic': self.topic, 'text': self.text()}
+
+class EventBus:
+    def __init__(self):
+        self.sinks = []  # (sink, lowest level it gets, topic prefix it gets)
+        self.threshold = OFF  # lowest level any sink wants
+
+    # prefix limits the sink to topics that start with it, e.g. 'server.'
+    def add_sink(self, sink, level=INFO, prefix=''):
+        self.sinks.append((sink, level, prefix))
+        self.threshold = min(self.threshold, level)
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks = [entry for entry in self.sinks if entry[0] is not sink]
+        self.threshold = min((level for other, level, prefix in self.sinks), default=OFF)
+        sink.flush()
+
+    def wants(self, level):
+        return level >= self.threshold
+
+    def emit(self, level, topic, message, **fields):
+        if level < self.threshold:
+            return
+        event = Event(level, topic, message, fields)
+        for sink, sink_level, prefix in self.sinks:
+            if level >= sink_level and topic.startswith(prefix):
+                sink.write(event)
+
+    def debug(self, topic, message, **fields):
+        self.emit(DEBUG, topic, message, **fields)
+
+    def info(self, topic, message, **fields):
+        self.emit(INFO, topic, message, **fields)
+
+    def warning(self, topic, message, **fields):
+        self.emit(WARNING, topic, message, **fields)
+
+    def error(self, topic, message, **fields):
+        self.emit(ERROR, topic, message, **fields)
+
+    def flush(self):
+        for sink, level, prefix in self.sinks:
+            sink.flush()
+
+# Swallows everything, e.g. to measure what emitting costs by itself
+class NullSink:
+    def write(self, event):
+        pass
+
+    def flush(self):
+        pass
+
+# Writes each event's text to a stream as it happens, like the print() calls it replaces
+class ConsoleSink:
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, event):
+        (self.stream or sys.stdout).write(event.text() + '\n')
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+# Keeps the last capacity events in memory, e.g. to show what led up to a crash on a kiosk
+class RingBufferSink:
+    def __init__(self, capacity=1000):
+        self.events = deque(maxlen=capacity)
+
+    def write(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def clear(self):
+        self.events.clear()
+
+# Appends lines to a file in batches of batch_size events, and at the latest
+# flush_interval seconds after an event came in, instead of one write per event.
+# The interval is kept by a timer thread, so events aren't held back while the bus
+# is quiet, e.g. while the game sleeps until the next click. Flushed at exit.
+class BatchedFileSink:
+    def __init__(self, path, batch_size=256, flush_interval=1.0):
+        self.file = open(path, 'a')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lines = []
+        self.lock = threading.Lock()  # the timer flushes from its own thread
+        self.timer = None  # pending flush of the lines written since the last one
+        atexit.register(self.close)
+
+    def write(self, event):
+        line = f'{event.time:.6f} {LEVEL_NAMES.get(event.level, event.level)} {event.topic} {event.text()}\n'
+        with self.lock:
+            self.lines.append(line)
+            if len(self.lines) >= self.batch_size:
+                self.write_lines()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.write_lines()
+
+    # Called with the lock held
+    def write_lines(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.lines and not self.file.closed:
+            self.file.writelines(self.lines)
+            self.file.flush()
+        self.lines.clear()
+
+    def close(self):
+        with self.lock:
+            self.write_lines()
+            self.file.close()
+
+bus = EventBus()
@@ -0,0 +1,396 @@
+import argparse
+import mmap
+import struct
+from collections import defaultdict
+from engine import Card, Player, RoundResult, WarEngine, player_number
+
+# Compact binary traces of War games.
+#
+# A trace file holds any number of games, written one after another as records:
+#   G  game id (u64), player 1's hand, player 2's hand       the deal
+#   R  plays, wars (u8), round winner (u8), reshuffles        one per round
+#   K  round (u32), both hands, both won piles, the pot      every keyframe_interval rounds
+#   E  winner (u8), rounds (u32), keyframe table             end of the game
+# A pile is a length byte followed by one Card.code byte per card, bottom to top.
+# Plays are the cards of a round in table order. Players always alternate starting
+# with player 1, so they aren't stored. Each reshuffle stores the player byte and
+# the new hand, which means a game can be rebuilt without the random generator.
+#
+# The file ends with an index of (game id, offset of G, offset of E), the offset of
+# that index and a magic string. A reader can then mmap the file, find any game
+# straight away and reach any round from the nearest keyframe.
+
+MAGIC = b'WARTRACE'
+INDEX_MAGIC = b'WARINDEX'
+VERSION = 1
+
+GAME = ord('G')
+ROUND = ord('R')
+KEYFRAME = ord('K')
+END = ord('E')
+
+def pack_pile(cards):
+    return bytes([len(cards)]) + bytes(card.code for card in cards)
+
+def read_pile(data, pos):
+    length = data[pos]
+    return list(data[pos + 1:pos + 1 + length]), pos + 1 + length
+
+class TraceWriter:
+    def __init__(self, path, keyframe_interval=64, buffer_size=1 << 20):
+        self.file = open(path, 'wb')
+        self.keyframe_interval = keyframe_interval
+        self.buffer_size = buffer_size
+        self.buffer = bytearray(MAGIC + bytes([VERSION]))
+        self.flushed = 0  # bytes already written to the file
+        self.index = []  # (game id, offset of G, offset of E)
+        self.engine = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def tell(self):
+        return self.flushed + len(self.buffer)
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.flushed += len(self.buffer)
+        self.buffer.clear()
+
+    # Start a game right after the engine has dealt
+    def begin_game(self, engine, game_id):
+        if engine.card_count > 255:
+            raise ValueError(f'piles are stored with a length byte, a {engine.card_count} card deck is too big')
+        self.engine = engine
+        self.game_id = game_id
+        self.game_offset = self.tell()
+        self.rounds = 0
+        self.keyframes = []  # (round, offset of K)
+        self.write(bytes([GAME]) + struct.pack('<Q', game_id) + pack_pile(engine.player1.hand) + pack_pile(engine.player2.hand))
+
+    def record_round(self, result):
+        engine = self.engine
+        record = bytearray([ROUND, len(result.plays)])
+        record += bytes(card.code for player, card, kind in result.plays)
+        record += bytes([result.wars, player_number(engine, result.round_winner), len(result.reshuffles)])
+        for player, hand in result.reshuffles:
+            record.append(player_number(engine, player))
+            record += pack_pile(hand)
+        self.write(record)
+        self.rounds += 1
+        if self.rounds % self.keyframe_interval == 0 and not engine.finished():
+            self.write_keyframe()
+
+    def write_keyframe(self):
+        engine = self.engine
+        self.keyframes.append((self.rounds, self.tell()))
+        self.write(bytes([KEYFRAME]) + struct.pack('<I', self.rounds) +
+                   pack_pile(engine.player1.hand) + pack_pile(engine.player1.won_cards) +
+                   pack_pile(engine.player2.hand) + pack_pile(engine.player2.won_cards) +
+                   pack_pile(engine.cards_in_play))
+
+    def end_game(self):
+        end_offset = self.tell()
+        record = bytearray([END]) + struct.pack('<BII', player_number(self.engine, self.engine.winner), self.rounds, len(self.keyframes))
+        for keyframe in self.keyframes:
+            record += struct.pack('<IQ', *keyframe)
+        self.write(record)
+        self.index.append((self.game_id, self.game_offset, end_offset))
+        self.engine = None
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.tell()
+        for entry in self.index:
+            self.write(struct.pack('<QQQ', *entry))
+        self.write(struct.pack('<QQ', index_offset, len(self.index)) + INDEX_MAGIC)
+        self.flush()
+        self.file.close()
+
+# Play a game to the end, writing it to the trace as it goes
+def record_game(writer, engine, game_id, max_rounds=10000):
+    writer.begin_game(engine, game_id)
+    while not engine.finished() and engine.rounds < max_rounds:
+        writer.record_round(engine.step())
+    writer.end_game()
+
+class RoundRecord:
+    __slots__ = ('plays', 'wars', 'winner', 'reshuffles')
+
+    def __init__(self, plays, wars, winner, reshuffles):
+        self.plays = plays  # card codes in table order, players alternating from player 1
+        self.wars = wars
+        self.winner = winner  # 1 or 2 for the player who took the pot, 0 if nobody did
+        self.reshuffles = reshuffles  # [(player number, new hand codes)]
+
+    def kind(self, i):
+        if i < 2:
+            return 'battle'
+        return 'up' if (i - 2) % 8 >= 6 else 'down'  # every war iteration is 3 + 3 face down, then 1 + 1 face up
+
+    def war(self):
+        return len(self.plays) >= 2 and self.plays[0] & 0xF == self.plays[1] & 0xF
+
+    # Whether a war ended because a player ran out of cards rather than on the face-up cards
+    def short(self):
+        if not self.war() or not self.winner:
+            return False
+        count = len(self.plays)
+        return count == 2 or (count - 2) % 8 != 0 or self.plays[-1] & 0xF == self.plays[-2] & 0xF
+
+# Apply a round to a state [hand1, won1, hand2, won2, pot] of code lists, in place
+def apply_round(state, record):
+    reshuffles = {1: [], 2: []}
+    for player, hand in record.reshuffles:
+        reshuffles[player].append(hand)
+    for i, code in enumerate(record.plays):
+        hand, won = (0, 1) if i % 2 == 0 else (2, 3)
+        state[hand].pop()
+        if not state[hand] and state[won]:
+            state[hand] = list(reshuffles[1 if i % 2 == 0 else 2].pop(0))
+            state[won] = []
+    if not record.plays:  # somebody couldn't play a battle card, both still took one the way Player.play_card does
+        for player, hand, won in ((1, 0, 1), (2, 2, 3)):
+            if state[hand]:
+                state[hand].pop()
+            if not state[hand] and state[won]:
+                state[hand] = list(reshuffles[player].pop(0))
+                state[won] = []
+    if record.war():
+        state[4] = list(record.plays)  # only this round's cards stay in the pot
+    else:
+        state[4].extend(record.plays)
+    if record.winner:
+        state[1 if record.winner == 1 else 3].extend(state[4])
+        state[4] = []
+
+class GameTrace:
+    def __init__(self, data, game_id, start, end):
+        self.data = data
+        self.game_id = game_id
+        hand1, pos = read_pile(data, start + 9)
+        hand2, pos = read_pile(data, pos)
+        self.deal = (hand1, hand2)
+        self.first_round = pos
+        self.winner, self.rounds, count = struct.unpack_from('<BII', data, end + 1)
+        self.keyframes = [struct.unpack_from('<IQ', data, end + 10 + 12 * i) for i in range(count)]
+
+    def read_keyframe(self, pos):
+        state = []
+        pos += 5
+        for _ in range(5):
+            pile, pos = read_pile(self.data, pos)
+            state.append(pile)
+        return state, pos
+
+    # Returns the round record starting at pos and where the next one starts, skipping keyframes
+    def read_round(self, pos):
+        data = self.data
+        if data[pos] == KEYFRAME:
+            pos = self.read_keyframe(pos)[1]
+        count = data[pos + 1]
+        pos += 2
+        plays = tuple(data[pos:pos + count])
+        pos += count
+        wars, winner, reshuffle_count = data[pos], data[pos + 1], data[pos + 2]
+        pos += 3
+        reshuffles = []
+        for _ in range(reshuffle_count):
+            player = data[pos]
+            hand, pos = read_pile(data, pos + 1)
+            reshuffles.append((player, hand))
+        return RoundRecord(plays, wars, winner, reshuffles), pos
+
+    # The state after the given number of rounds and where the next round starts
+    def seek(self, round):
+        round = max(0, min(round, self.rounds))
+        state = [list(self.deal[0]), [], list(self.deal[1]), [], []]
+        at, pos = 0, self.first_round
+        for keyframe_round, offset in self.keyframes:
+            if keyframe_round > round:
+                break
+            at = keyframe_round
+            state, pos = self.read_keyframe(offset)
+        while at < round:
+            record, pos = self.read_round(pos)
+            apply_round(state, record)
+            at += 1
+        return state, pos
+
+    def state_at(self, round):
+        return self.seek(round)[0]
+
+    def round(self, round):  # rounds count from 1
+        return self.read_round(self.seek(round - 1)[1])[0]
+
+class TraceReader:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC or self.data[-len(INDEX_MAGIC):] != INDEX_MAGIC:
+            raise ValueError(f'{path} is not a complete War trace')
+        self.index_offset, self.count = struct.unpack_from('<QQ', self.data, len(self.data) - len(INDEX_MAGIC) - 16)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def game(self, i):
+        return GameTrace(self.data, *struct.unpack_from('<QQQ', self.data, self.index_offset + 24 * i))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+# Plays a recorded game back through the WarEngine interface, so WarGame can show it
+class ReplayEngine:
+    def __init__(self, game, start_round=0, player1_name='Opponent', player2_name='You'):
+        self.game = game
+        self.player1 = Player(player1_name)
+        self.player2 = Player(player2_name)
+        state, self.position = game.seek(start_round)
+        self.rounds = min(max(start_round, 0), game.rounds)
+        self.player1.hand.extend(self.make_cards(state[0]))
+        self.player1.won_cards.extend(self.make_cards(state[1]))
+        self.player2.hand.extend(self.make_cards(state[2]))
+        self.player2.won_cards.extend(self.make_cards(state[3]))
+        self.cards_in_play = self.make_cards(state[4])
+        self.card_count = len(game.deal[0]) + len(game.deal[1])
+        self.war = bool(self.cards_in_play)  # a pot left over between rounds is a war that stayed tied
+        self.total_cards_played = 0
+        self.player1_win = False
+        self.player2_win = False
+        self.winner = None
+        self.cycle = None
+        self.check_winner(RoundResult())
+
+    def make_cards(self, codes):
+        cards = [Card.from_code(code) for code in codes]
+        for card in cards:
+            card.face_up = True
+        return cards
+
+    # A game recorded up to max_rounds ends with the trace, without a winner
+    def finished(self):
+        return self.winner is not None or self.rounds >= self.game.rounds
+
+    def check_winner(self, result):
+        if self.rounds >= self.game.rounds:
+            self.player1_win = self.game.winner == 1
+            self.player2_win = self.game.winner == 2
+            self.winner = self.player1 if self.player1_win else self.player2 if self.player2_win else None
+        result.game_winner = self.winner
+
+    # Turn the won pile into the hand in the recorded order
+    def reshuffle(self, player, codes, result):
+        pile = defaultdict(list)
+        for card in player.won_cards:
+            card.face_up = True
+            pile[card.code].append(card)
+        player.hand.extend(pile[code].pop() for code in codes)
+        player.won_cards.clear()
+        result.reshuffles.append((player, list(player.hand)))
+
+    def step(self):
+        result = RoundResult()
+        if self.rounds >= self.game.rounds:
+            self.check_winner(result)
+            return result
+        record, self.position = self.game.read_round(self.position)
+        self.rounds += 1
+
+        reshuffles = {1: [], 2: []}
+        for player, hand in record.reshuffles:
+            reshuffles[player].append(hand)
+        for i, code in enumerate(record.plays):
+            player = self.player1 if i % 2 == 0 else self.player2
+            card = player.hand.pop()
+            kind = record.kind(i)
+            card.face_up = kind != 'down'
+            if not player.hand and player.won_cards:
+                self.reshuffle(player, reshuffles[1 if i % 2 == 0 else 2].pop(0), result)
+            result.plays.append((player, card, kind))
+        if not record.plays:  # the last round: somebody couldn't play a battle card
+            for number, player in ((1, self.player1), (2, self.player2)):
+                if player.hand:
+                    player.hand.pop()
+                if not player.hand and player.won_cards:
+                    self.reshuffle(player, reshuffles[number].pop(0), result)
+        self.total_cards_played += len(record.plays)
+
+        cards = [card for player, card, kind in result.plays]
+        result.war = record.war()
+        result.wars = record.wars
+        if result.war:
+            self.cards_in_play = cards
+            if record.short():  # the player due to play next had no cards
+                result.short = self.player1 if len(cards) % 2 == 0 else self.player2
+        else:
+            self.cards_in_play.extend(cards)
+        self.war = result.war
+        if record.winner:
+            result.round_winner = self.player1 if record.winner == 1 else self.player2
+            result.round_winner.win_cards(self.cards_in_play)
+            self.cards_in_play = []
+            self.war = False
+        self.check_winner(result)
+        return result
+
+    def play_to_completion(self, max_rounds=None):
+        while not self.finished() and (max_rounds is None or self.rounds < max_rounds):
+            self.step()
+        return self.winner
+
+def main():
+    parser = argparse.ArgumentParser(description='Record, inspect and replay War game traces.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='simulate games into a trace file')
+    record.add_argument('path')
+    record.add_argument('--games', type=int, default=1000)
+    record.add_argument('--seed', type=int, default=0)
+    record.add_argument('--max-rounds', type=int, default=10000)
+    record.add_argument('--keyframe-interval', type=int, default=64)
+    for name in ('show', 'replay'):
+        command = commands.add_parser(name, help='print a game' if name == 'show' else 'watch a game from a round')
+        command.add_argument('path')
+        command.add_argument('--game', type=int, default=0)
+        command.add_argument('--round', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from tournament import game_rng
+        with TraceWriter(args.path, args.keyframe_interval) as writer:
+            for game in range(args.games):
+                record_game(writer, WarEngine(rng=game_rng(args.seed, game)), game, args.max_rounds)
+        return
+
+    reader = TraceReader(args.path)
+    game = reader.game(args.game)
+    if args.command == 'show':
+        print(f'Game {game.game_id}: {game.rounds} rounds, winner: {game.winner or "none"}')
+        hand1, won1, hand2, won2, pot = game.state_at(args.round)
+        print(f'After round {args.round}: Player 1 {len(hand1)} in hand, {len(won1)} won; Player 2 {len(hand2)} in hand, {len(won2)} won; pot {len(pot)}')
+        if args.round < game.rounds:
+            record = game.round(args.round + 1)
+            values = [code & 0xF for code in record.plays]
+            print(f'Round {args.round + 1}: cards {values}, wars {record.wars}, taken by: {record.winner or "nobody"}')
+    else:
+        from War import WarGame
+        WarGame(800, 600, engine=ReplayEngine(game, args.round)).run()
+
+if __name__ == "__main__":
+    main()
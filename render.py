@@ -0,0 +1,188 @@
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # no window, must be set before pygame starts
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from engine import WarEngine
+from War import WarGame
+from gametrace import ReplayEngine, TraceReader
+from tournament import game_rng
+
+# Renders games offscreen, one frame per click as the window would show it, as fast
+# as the frames can be drawn. Frames go straight to the output as they are made, so
+# memory stays the same for a game of any length.
+#
+#   python render.py --seed 42 --gif game.gif
+#   python render.py --trace games.wtr --game 17 --start-round 200 --rounds 50 --frames out/
+#   python render.py --seed 42 --min-wars 2 --gif wars.gif        only the rounds with ANOTHER WAR!
+#   python render.py --seed 42 --raw - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x600 -r 10 -i - game.mp4
+#
+# Games from --seed are the ones tournament.py and gametrace.py record play for the same seed and game number.
+
+# The writers take each frame with the parts of it that changed since the frame before:
+# a list of rects, [] if nothing changed, or None if not known.
+
+# Numbered PNG files in a directory
+class PngSequenceWriter:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frames = 0
+
+    def write(self, surface, changed=None):
+        pygame.image.save(surface, os.path.join(self.directory, f'frame_{self.frames:06d}.png'))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+# Every frame's RGB bytes back to back, to a file or '-' for stdout, e.g. to pipe into ffmpeg
+class RawFrameWriter:
+    def __init__(self, path):
+        self.file = sys.stdout.buffer if path == '-' else open(path, 'wb')
+
+    def write(self, surface, changed=None):
+        self.file.write(pygame.image.tobytes(surface, 'RGB'))
+
+    def close(self):
+        if self.file is sys.stdout.buffer:
+            self.file.flush()
+        else:
+            self.file.close()
+
+# An animated GIF written frame by frame, needs Pillow (pip install pillow). Every frame
+# uses one palette made from palette_surface, the card atlas, so no frame is quantized on
+# its own. Only the part of a frame that changed is encoded, drawn over the frame before,
+# and a frame that didn't change makes the one before last longer. The last frame is the
+# only one held back, whatever the length of the game.
+class GifWriter:
+    def __init__(self, path, fps, palette_surface):
+        try:
+            from PIL import Image, GifImagePlugin
+        except ImportError:
+            raise RuntimeError('GIF output needs Pillow (pip install pillow), or use --frames or --raw')
+        self.Image = Image
+        self.GifImagePlugin = GifImagePlugin
+        self.frame_time = 1000 / fps  # ms
+        self.palette = self.to_image(palette_surface).quantize(256, Image.Quantize.MEDIANCUT)
+        self.file = open(path, 'wb')
+        self.size = None
+        self.pending = None  # (image, offset) of the frame waiting to learn how long it lasts
+        self.pending_frames = 0
+
+    def to_image(self, surface):
+        return self.Image.frombytes('RGB', surface.get_size(), pygame.image.tobytes(surface, 'RGB'))
+
+    def write(self, surface, changed=None):
+        if self.size is None:
+            self.size = surface.get_size()
+            self.write_header()
+            changed = None
+        if changed == [] and self.pending is not None:
+            self.pending_frames += 1
+            return
+        area = changed[0].unionall(changed[1:]) if changed else surface.get_rect()
+        image = self.to_image(surface.subsurface(area)).quantize(palette=self.palette, dither=self.Image.Dither.NONE)
+        self.flush()
+        self.pending = (image, area.topleft)
+        self.pending_frames = 1
+
+    def write_header(self):
+        width, height = self.size
+        palette = bytes(self.palette.getpalette()[:768]).ljust(768, b'\0')
+        self.file.write(b'GIF89a' + width.to_bytes(2, 'little') + height.to_bytes(2, 'little') + bytes((0xF7, 0, 0)) + palette)
+        self.file.write(b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')  # loop forever
+
+    def flush(self):
+        if self.pending is not None:
+            image, offset = self.pending
+            duration = round(self.frame_time * self.pending_frames / 10) * 10  # GIF delays are in 1/100 s
+            self.file.writelines(self.GifImagePlugin.getdata(image, offset, duration=duration))
+            self.pending = None
+
+    def close(self):
+        if self.size is not None:
+            self.flush()
+            self.file.write(b';')
+        self.file.close()
+
+# Click through game's rounds from where its engine is until it finishes or reaches last_round,
+# writing a frame whenever the table changed. With min_wars only rounds with at least that
+# many war iterations are written. The winner screen is held for hold_end frames.
+def render_game(game, writer, last_round=None, min_wars=0, hold_end=10):
+    engine = game.engine
+    game.start()
+    frames = 0
+    game.room.renderDirty(game)
+    if not min_wars:
+        writer.write(game.window, None)
+        frames += 1
+    while not engine.finished() and (last_round is None or engine.rounds < last_round or game.turn_over):
+        result = game.play_round()
+        if engine.winner is not None:
+            game.show_winner(game.win_text)
+        changed = game.room.renderDirty(game)
+        if changed and (not min_wars or result is not None and result.wars >= min_wars):
+            writer.write(game.window, None if min_wars else changed)  # rounds left out changed the table too
+            frames += 1
+    if engine.winner is not None and not min_wars:
+        for _ in range(hold_end):
+            writer.write(game.window, [])
+            frames += 1
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description='Render War games to frames without a window.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--seed', type=int, default=0, help='play the game this tournament seed gives (default)')
+    source.add_argument('--trace', metavar='PATH', help='render a game recorded with gametrace.py')
+    parser.add_argument('--game', type=int, default=0, help='game number for the seed, or game in the trace')
+    parser.add_argument('--start-round', type=int, default=0, help='play this many rounds before the first frame')
+    parser.add_argument('--rounds', type=int, help='render at most this many rounds')
+    parser.add_argument('--max-rounds', type=int, default=10000, help='stop a seeded game that goes on longer')
+    parser.add_argument('--min-wars', type=int, default=0, help='only write rounds with at least this many war iterations')
+    parser.add_argument('--size', default='800x600', help='WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=float, default=10, help='frame rate of the GIF, and the real time to compare with')
+    parser.add_argument('--hold-end', type=int, default=10, help='frames to show the winner for')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--gif', metavar='PATH')
+    output.add_argument('--frames', metavar='DIRECTORY', help='write frame_000000.png, frame_000001.png, ...')
+    output.add_argument('--raw', metavar='PATH', help="raw RGB frames, '-' for stdout")
+    args = parser.parse_args()
+    width, height = (int(n) for n in args.size.lower().split('x'))
+
+    if args.trace:
+        recorded = TraceReader(args.trace).game(args.game)
+        engine = ReplayEngine(recorded, args.start_round)
+        limit = recorded.rounds
+    else:
+        engine = WarEngine(rng=game_rng(args.seed, args.game))
+        engine.play_to_completion(max_rounds=args.start_round)
+        limit = args.max_rounds
+    last_round = min(limit, engine.rounds + args.rounds) if args.rounds is not None else limit
+
+    game = WarGame(width, height, dirty_rects=True, engine=engine, event_driven=False)
+    if args.gif:
+        writer = GifWriter(args.gif, args.fps, game.card_images.atlas)  # every colour on the table is in the cards
+    elif args.frames:
+        writer = PngSequenceWriter(args.frames)
+    else:
+        writer = RawFrameWriter(args.raw)
+    first_round = engine.rounds
+    start = time.perf_counter()
+    try:
+        frames = render_game(game, writer, last_round, args.min_wars, args.hold_end)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f'{frames} frames of rounds {first_round + 1} to {engine.rounds} in {elapsed:.2f}s, '
+          f'{frames / elapsed:.0f} frames/s, {frames / args.fps / elapsed:.0f}x real time at {args.fps:g} fps', file=sys.stderr)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
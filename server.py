@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import types
+from collections import deque
+from engine import WarEngine, player_number
+from eventlog import bus, ConsoleSink, INFO
+
+# Many independent War sessions in one asyncio event loop. A session is only a
+# WarEngine, so no display is involved and a node can hold thousands of tables.
+#
+# The protocol is one JSON object per line each way, over TCP or a Unix socket.
+# Every request has an "op" and may carry an "id" that the reply echoes:
+#   {"op": "new", "seed": 42}            -> {"session": 1, "state": {...}}
+#   {"op": "step", "session": 1}         -> {"result": {...}, "state": {...}}
+#       "rounds": n plays n rounds (stopping at the end of the game) and returns the last result
+#   {"op": "state", "session": 1}        -> {"state": {...}}
+#   {"op": "close", "session": 1}        -> {"closed": 1}
+#   {"op": "stats"}                      -> {"sessions": n, "memory": bytes, ...}
+# Failures reply {"error": "..."}. Sessions belong to the connection that opened
+# them and end with it.
+#
+# Cards travel as Card.code and players as 1 and 2, 0 meaning nobody:
+#   state:  hands and won piles ([player 1, player 2], bottom to top), pot, war,
+#           rounds, total_cards_played, card_count, winner
+#   result: plays ([player, code, kind]), war, wars, short, round_winner, game_winner
+
+def encode_state(engine):
+    players = (engine.player1, engine.player2)
+    return {'hands': [[card.code for card in player.hand] for player in players],
+            'won': [[card.code for card in player.won_cards] for player in players],
+            'pot': [card.code for card in engine.cards_in_play],
+            'war': engine.war,
+            'rounds': engine.rounds,
+            'total_cards_played': engine.total_cards_played,
+            'card_count': engine.card_count,
+            'winner': player_number(engine, engine.winner)}
+
+def encode_result(engine, result):
+    return {'plays': [[player_number(engine, player), card.code, kind] for player, card, kind in result.plays],
+            'war': result.war,
+            'wars': result.wars,
+            'short': player_number(engine, result.short),
+            'round_winner': player_number(engine, result.round_winner),
+            'game_winner': player_number(engine, result.game_winner)}
+
+# Rough bytes held by an object and everything it refers to, counting shared objects once per call
+def deep_size(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (types.ModuleType, type, types.FunctionType, types.MethodType)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot):
+                size += deep_size(getattr(obj, slot), seen)
+    return size
+
+class Session:
+    def __init__(self, session_id, seed=None):
+        self.id = session_id
+        self.engine = WarEngine(rng=random.Random(seed))
+        self.created = time.monotonic()
+        self.last_active = self.created
+
+    def step(self, rounds=1):
+        self.last_active = time.monotonic()
+        result = self.engine.step()
+        for _ in range(rounds - 1):
+            if self.engine.finished():
+                break
+            result = self.engine.step()
+        return result
+
+    def memory(self):
+        return deep_size(self.engine)
+
+class WarServer:
+    def __init__(self, max_sessions=10000, max_rounds_per_step=10000):
+        self.max_sessions = max_sessions
+        self.max_rounds_per_step = max_rounds_per_step
+        self.sessions = {}  # id -> Session
+        self.next_id = 1
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        owned = set()  # ids of the sessions this connection opened
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    reply = self.dispatch(request, owned)
+                    if 'id' in request:
+                        reply['id'] = request['id']
+                except (ValueError, TypeError, KeyError, AttributeError) as e:  # bad JSON or a malformed request
+                    reply = {'error': f'bad request: {e}'}
+                writer.write(json.dumps(reply, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # the client went away or sent a line too long to read
+        finally:
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            self.connections -= 1
+            writer.close()
+
+    def session(self, request, owned):
+        session_id = request['session']
+        if session_id not in owned:
+            raise ValueError(f'no session {session_id} on this connection')
+        return self.sessions[session_id]
+
+    def dispatch(self, request, owned):
+        op = request.get('op')
+        if op == 'new':
+            if len(self.sessions) >= self.max_sessions:
+                return {'error': f'server full ({self.max_sessions} sessions)'}
+            session = Session(self.next_id, request.get('seed'))
+            self.next_id += 1
+            self.sessions[session.id] = session
+            owned.add(session.id)
+            return {'session': session.id, 'state': encode_state(session.engine)}
+        if op == 'step':
+            session = self.session(request, owned)
+            rounds = request.get('rounds', 1)
+            if not isinstance(rounds, int) or not 1 <= rounds <= self.max_rounds_per_step:
+                return {'error': f'rounds must be between 1 and {self.max_rounds_per_step}'}
+            result = session.step(rounds)
+            return {'result': encode_result(session.engine, result), 'state': encode_state(session.engine)}
+        if op == 'state':
+            return {'state': encode_state(self.session(request, owned).engine)}
+        if op == 'close':
+            session = self.session(request, owned)
+            owned.discard(session.id)
+            del self.sessions[session.id]
+            return {'closed': session.id}
+        if op == 'stats':
+            return self.stats(request.get('sessions', False))
+        return {'error': f'unknown op {op!r}'}
+
+    # Session count and memory. Measuring walks every session, so it is only done when asked.
+    def stats(self, per_session=False):
+        sizes = {session_id: session.memory() for session_id, session in self.sessions.items()}
+        stats = {'sessions': len(self.sessions), 'connections': self.connections, 'max_sessions': self.max_sessions,
+                 'memory': sum(sizes.values()), 'memory_per_session': sum(sizes.values()) / len(sizes) if sizes else 0}
+        if per_session:
+            stats['session_memory'] = {str(session_id): size for session_id, size in sizes.items()}
+        return stats
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        bus.info('server.listening', 'Serving War sessions on {addresses}', addresses=addresses)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve many War sessions over TCP or a Unix socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--max-sessions', type=int, default=10000)
+    args = parser.parse_args()
+    bus.add_sink(ConsoleSink(), INFO, 'server.')  # not what happens at every table
+    try:
+        asyncio.run(WarServer(args.max_sessions).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
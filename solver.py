@@ -0,0 +1,251 @@
+import argparse
+from collections import Counter
+from engine import Deck, WarEngine
+
+# Exact War outcomes for small decks. The game is a Markov chain whose randomness
+# is the reshuffle of a won pile, so the solver explores every reachable state with
+# every reshuffle outcome and solves the chain for the chance that each player wins
+# and the expected number of rounds.
+#
+# States are canonical tuples (hand1, won1, hand2, won2, pot). Suits never matter,
+# so cards are just values. Hands run from bottom to top. Won piles and the pot are
+# sorted because they are always shuffled before anyone plays from them. That way
+# every deal and every round that reaches the same position shares one entry.
+#
+# The rules are those of WarEngine.step() with shuffled won piles.
+
+PLAYER1_WINS = 1
+PLAYER2_WINS = 2
+
+# Raised when a round reaches a reshuffle that isn't covered by the choices yet
+class Branch(Exception):
+    def __init__(self, count):
+        self.count = count
+
+# Every distinct ordering of a multiset of values, each one equally likely after a shuffle
+def arrangements(values):
+    counts = Counter(values)
+    ordering = []
+    found = []
+
+    def extend():
+        if len(ordering) == len(values):
+            found.append(tuple(ordering))
+            return
+        for value in sorted(counts):
+            if counts[value]:
+                counts[value] -= 1
+                ordering.append(value)
+                extend()
+                ordering.pop()
+                counts[value] += 1
+
+    extend()
+    return found
+
+# The state after dealing deck_values the way WarEngine.deal_cards does: popping from the end, player 1 first
+def deal_state(deck_values):
+    dealt = list(reversed(deck_values))
+    return (tuple(dealt[0::2]), (), tuple(dealt[1::2]), (), ())
+
+# The canonical state of a running WarEngine, e.g. to evaluate a particular deal
+def engine_state(engine):
+    values = lambda cards: tuple(card.value for card in cards)
+    sort = lambda cards: tuple(sorted(card.value for card in cards))
+    return (values(engine.player1.hand), sort(engine.player1.won_cards),
+            values(engine.player2.hand), sort(engine.player2.won_cards), sort(engine.cards_in_play))
+
+class WarSolver:
+    def __init__(self, ranks=3, copies=2):
+        self.deck_values = [card.value for card in Deck(ranks=ranks, copies=copies).cards]
+        if len(self.deck_values) % 2:
+            raise ValueError(f'the deck has to split evenly between two players, got {len(self.deck_values)} cards')
+        self.card_count = len(self.deck_values)
+        self.shuffles = {}  # sorted won pile -> its arrangements
+        self.transitions = {}  # state -> [(probability, next state or winner)]
+        self.player1_wins = {}  # state -> probability that player 1 wins from there
+        self.player2_wins = {}
+        self.rounds = {}  # state -> expected number of rounds left
+
+    def arrangements(self, won):
+        key = tuple(sorted(won))
+        options = self.shuffles.get(key)
+        if options is None:
+            options = self.shuffles[key] = arrangements(key)
+        return options
+
+    # Play one round from state, taking choices[i] as the outcome of the i-th reshuffle.
+    # Returns (outcome, probability of those reshuffle outcomes).
+    def play_round(self, state, choices):
+        hands = [list(state[0]), list(state[2])]
+        won = [list(state[1]), list(state[3])]
+        pot = list(state[4])
+        taken = []
+
+        def reshuffle(p):
+            options = self.arrangements(won[p])
+            if len(taken) == len(choices):
+                raise Branch(len(options))
+            hands[p] = list(options[choices[len(taken)]])
+            taken.append(len(options))
+            won[p] = []
+
+        def play(p):  # Player.play_card
+            if not hands[p]:
+                if won[p]:
+                    reshuffle(p)
+                return None
+            card = hands[p].pop()
+            if not hands[p] and won[p]:
+                reshuffle(p)
+            return card
+
+        def award(p):
+            won[p].extend(pot)
+            pot.clear()
+
+        card1 = play(0)
+        card2 = play(1)
+        if card1 is None:
+            outcome = PLAYER2_WINS
+        elif card2 is None:
+            outcome = PLAYER1_WINS
+        else:
+            pot.extend([card1, card2])
+            if card1 > card2:
+                award(0)
+            elif card1 < card2:
+                award(1)
+            else:
+                self.play_war(hands, pot, play, award, card1, card2)
+            if len(hands[0]) + len(won[0]) == self.card_count:
+                outcome = PLAYER1_WINS
+            elif len(hands[1]) + len(won[1]) == self.card_count:
+                outcome = PLAYER2_WINS
+            else:
+                outcome = (tuple(hands[0]), tuple(sorted(won[0])), tuple(hands[1]), tuple(sorted(won[1])), tuple(sorted(pot)))
+
+        probability = 1.0
+        for count in taken:
+            probability /= count
+        return outcome, probability
+
+    def play_war(self, hands, pot, play, award, card1, card2):
+        pot[:] = [card1, card2]  # only the cards that caused the war stay in the pot
+        for _ in range(2):
+            for _ in range(3):
+                for p in (0, 1):
+                    if not hands[p]:
+                        award(1 - p)
+                        return
+                    pot.append(play(p))
+            face_up_cards = []
+            for p in (0, 1):
+                if not hands[p]:
+                    award(1 - p)
+                    return
+                face_up_cards.append(play(p))
+                pot.append(face_up_cards[-1])
+            if face_up_cards[0] > face_up_cards[1]:
+                award(0)
+                return
+            elif face_up_cards[0] < face_up_cards[1]:
+                award(1)
+                return
+
+    # Every outcome of one round from state with its probability, memoized
+    def outcomes(self, state):
+        found = self.transitions.get(state)
+        if found is not None:
+            return found
+        totals = {}
+        pending = [()]
+        while pending:
+            choices = pending.pop()
+            try:
+                outcome, probability = self.play_round(state, choices)
+            except Branch as branch:
+                pending.extend(choices + (i,) for i in range(branch.count))
+                continue
+            totals[outcome] = totals.get(outcome, 0.0) + probability
+        found = self.transitions[state] = [(probability, outcome) for outcome, probability in totals.items()]
+        return found
+
+    # Find every state reachable from the given ones
+    def explore(self, states):
+        pending = [state for state in states if state not in self.transitions]
+        while pending:
+            for probability, outcome in self.outcomes(pending.pop()):
+                if isinstance(outcome, tuple) and outcome not in self.transitions:
+                    pending.append(outcome)
+
+    # Solve the chain over every explored state by iterating to a fixed point
+    def solve(self, tolerance=1e-13, max_iterations=1000000):
+        for values in (self.player1_wins, self.player2_wins, self.rounds):
+            for state in self.transitions:
+                values.setdefault(state, 0.0)
+        terminal = {PLAYER1_WINS: (1.0, 0.0), PLAYER2_WINS: (0.0, 1.0)}
+        for iteration in range(max_iterations):
+            change = 0.0
+            for state, outcomes in self.transitions.items():
+                player1 = player2 = 0.0
+                rounds = 1.0
+                for probability, outcome in outcomes:
+                    if outcome in terminal:
+                        player1 += probability * terminal[outcome][0]
+                        player2 += probability * terminal[outcome][1]
+                    else:
+                        player1 += probability * self.player1_wins[outcome]
+                        player2 += probability * self.player2_wins[outcome]
+                        rounds += probability * self.rounds[outcome]
+                change = max(change, abs(player1 - self.player1_wins[state]), abs(player2 - self.player2_wins[state]),
+                             abs(rounds - self.rounds[state]) / rounds)
+                self.player1_wins[state] = player1
+                self.player2_wins[state] = player2
+                self.rounds[state] = rounds
+            if change < tolerance:
+                return iteration + 1
+        return max_iterations
+
+    # (chance player 1 wins, chance player 2 wins, expected rounds) from one state
+    def evaluate(self, state):
+        if state not in self.player1_wins:
+            self.explore([state])
+            self.solve()
+        return (self.player1_wins[state], self.player2_wins[state], self.rounds[state])
+
+    # The same over every deal of the deck, each distinct deal weighted by how likely it is
+    def evaluate_all_deals(self):
+        deals = arrangements(self.deck_values)
+        states = [deal_state(deal) for deal in deals]
+        self.explore(states)
+        self.solve()
+        weight = 1.0 / len(deals)
+        player1 = sum(self.player1_wins[state] for state in states) * weight
+        player2 = sum(self.player2_wins[state] for state in states) * weight
+        rounds = sum(self.rounds[state] for state in states) * weight
+        return (player1, player2, rounds)
+
+def main():
+    parser = argparse.ArgumentParser(description='Exact War outcomes for a small deck.')
+    parser.add_argument('--ranks', type=int, default=3)
+    parser.add_argument('--copies', type=int, default=2)
+    parser.add_argument('--check', type=int, default=0, help='also play this many random games to compare with')
+    args = parser.parse_args()
+
+    solver = WarSolver(args.ranks, args.copies)
+    player1, player2, rounds = solver.evaluate_all_deals()
+    print(f'Deck: {args.ranks} ranks x {args.copies} copies, {len(solver.transitions)} states')
+    print(f'Player 1 wins: {player1:.6f}, Player 2 wins: {player2:.6f}, expected rounds: {rounds:.4f}')
+
+    if args.check:
+        wins = 0
+        total_rounds = 0
+        for _ in range(args.check):
+            engine = WarEngine(ranks=args.ranks, copies=args.copies)
+            wins += engine.play_to_completion() is engine.player1
+            total_rounds += engine.rounds
+        print(f'Monte Carlo over {args.check} games: Player 1 wins: {wins / args.check:.6f}, rounds: {total_rounds / args.check:.4f}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import json
+import math
+from collections import Counter
+
+# Streaming statistics for simulated games. Everything here takes one value at a
+# time in constant memory and merges with another instance of the same kind, so
+# workers can each keep their own and a run can be combined with earlier runs.
+#
+#   python stats.py run1.json run2.json --out all.json    merge saved runs and report
+
+# Count, mean, variance, min and max with Welford's update. Merging uses the
+# pairwise formula of Chan et al., so it is as accurate as adding every value in one place.
+class RunningStats:
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def stdev(self):
+        return math.sqrt(self.variance())
+
+    def as_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.mean = data['mean']
+        stats.m2 = data['m2']
+        if stats.count:
+            stats.min = data['min']
+            stats.max = data['max']
+        return stats
+
+# Quantiles of non-negative values to within relative_accuracy, from counts in
+# logarithmic buckets: bucket i holds the values in (gamma^(i-1), gamma^i]. Game
+# lengths up to 10^5 rounds need a few hundred buckets at 1%, however many games
+# are added, and merging only adds up counts.
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f'relative_accuracy must be between 0 and 1, got {relative_accuracy}')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = Counter()  # bucket index -> values in it
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        if value < 0:
+            raise ValueError(f'the sketch only takes non-negative values, got {value}')
+        self.count += 1
+        if value == 0:
+            self.zeros += 1
+        else:
+            self.buckets[math.ceil(math.log(value) / self.log_gamma)] += 1
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f'can only merge sketches of the same accuracy, got {self.relative_accuracy} and {other.relative_accuracy}')
+        self.buckets.update(other.buckets)
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)  # the middle of the bucket, in relative terms
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def as_dict(self):
+        return {'relative_accuracy': self.relative_accuracy, 'zeros': self.zeros,
+                'buckets': sorted(self.buckets.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.zeros = data['zeros']
+        sketch.buckets.update({index: count for index, count in data['buckets']})
+        sketch.count = sketch.zeros + sum(sketch.buckets.values())
+        return sketch
+
+# Exact counts of small integer values, e.g. the winner or how deep a war went
+class Histogram:
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, value, count=1):
+        self.counts[value] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def as_dict(self):
+        return {str(value): count for value, count in sorted(self.counts.items())}  # JSON keys are strings
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts.update({int(value): count for value, count in data.items()})
+        return histogram
+
+# What one game came to, as collected by play_game in tournament.py.
+# war_depths counts the wars of the game by how many iterations they took.
+class GameSummary:
+    __slots__ = ('winner', 'cyclic', 'rounds', 'wars', 'cards_played', 'reshuffles', 'lead_changes', 'war_depths')
+
+    def __init__(self, winner, cyclic, rounds, wars, cards_played, reshuffles, lead_changes, war_depths):
+        self.winner = winner  # 1, 2, or 0 if unfinished
+        self.cyclic = cyclic
+        self.rounds = rounds
+        self.wars = wars
+        self.cards_played = cards_played
+        self.reshuffles = reshuffles
+        self.lead_changes = lead_changes
+        self.war_depths = war_depths  # iterations -> wars
+
+# Everything a tournament reports, in the same few kilobytes for ten games or 10^8
+class GameStats:
+    MEASURES = ('rounds', 'wars', 'cards_played', 'reshuffles', 'lead_changes')  # GameSummary fields with moments and quantiles
+
+    def __init__(self, relative_accuracy=0.01):
+        self.games = 0
+        self.cycles = 0
+        self.winners = Histogram()
+        self.war_depth = Histogram()  # wars by iterations, 2 is the ANOTHER WAR! path
+        self.moments = {name: RunningStats() for name in self.MEASURES}
+        self.quantiles = {name: QuantileSketch(relative_accuracy) for name in self.MEASURES}
+
+    def add(self, summary):
+        self.games += 1
+        self.cycles += summary.cyclic
+        self.winners.add(summary.winner)
+        for depth, wars in summary.war_depths.items():
+            self.war_depth.add(depth, wars)
+        for name in self.MEASURES:
+            value = getattr(summary, name)
+            self.moments[name].add(value)
+            self.quantiles[name].add(value)
+
+    def merge(self, other):
+        self.games += other.games
+        self.cycles += other.cycles
+        self.winners.merge(other.winners)
+        self.war_depth.merge(other.war_depth)
+        for name in self.MEASURES:
+            self.moments[name].merge(other.moments[name])
+            self.quantiles[name].merge(other.quantiles[name])
+        return self
+
+    def as_dict(self):
+        return {'games': self.games, 'cycles': self.cycles,
+                'winners': self.winners.as_dict(), 'war_depth': self.war_depth.as_dict(),
+                'moments': {name: stats.as_dict() for name, stats in self.moments.items()},
+                'quantiles': {name: sketch.as_dict() for name, sketch in self.quantiles.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.games = data['games']
+        stats.cycles = data['cycles']
+        stats.winners = Histogram.from_dict(data['winners'])
+        stats.war_depth = Histogram.from_dict(data['war_depth'])
+        stats.moments = {name: RunningStats.from_dict(data['moments'][name]) for name in cls.MEASURES}
+        stats.quantiles = {name: QuantileSketch.from_dict(data['quantiles'][name]) for name in cls.MEASURES}
+        return stats
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def report(self):
+        winners = self.winners.counts
+        lines = [f'Games: {self.games}',
+                 f'Player 1 wins: {winners[1]}, Player 2 wins: {winners[2]}, unfinished: {winners[0]} ({self.cycles} cyclic)']
+        for name in self.MEASURES:
+            moments, sketch = self.moments[name], self.quantiles[name]
+            if not moments.count:
+                continue
+            quantiles = ', '.join(f'p{round(q * 100)} {sketch.quantile(q):.0f}' for q in (0.5, 0.9, 0.99))
+            lines.append(f'{name.replace("_", " ").capitalize()}: mean {moments.mean:.2f}, sd {moments.stdev():.2f}, '
+                         f'min {moments.min}, max {moments.max}, {quantiles}')
+        wars = self.war_depth.total()
+        if wars:
+            depths = ', '.join(f'{depth}: {count} ({count / wars:.2%})' for depth, count in sorted(self.war_depth.counts.items()))
+            lines.append(f'War iterations per war: {depths}')
+        return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge saved tournament statistics and report them.')
+    parser.add_argument('paths', nargs='+', help='files written by tournament.py --stats-out')
+    parser.add_argument('--out', help='write the merged statistics here')
+    args = parser.parse_args()
+    stats = GameStats.load(args.paths[0])
+    for path in args.paths[1:]:
+        stats.merge(GameStats.load(path))
+    print(stats.report())
+    if args.out:
+        stats.dump(args.out)
+
+if __name__ == "__main__":
+    main()
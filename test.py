@@ -1,21 +1,152 @@
 #imports
 import pygame
+import weakref
+import functools
+import json
+import time
+from collections import OrderedDict, deque
+
+#Frame Profiler
+
+#Times named phases of each frame and counts events in it, keeping the last maxFrames frames in a ring buffer
+#It can be turned on and off at any time and costs next to nothing while off:
+#phase() hands back a shared do-nothing context manager and count() returns straight away
+class Profiler:
+    def __init__(self, maxFrames = 600):
+        self.enabled = False
+        self.frames = deque(maxlen = maxFrames)
+        self.frame = None #frame being recorded -> None while off or between frames
+        self.noPhase = ProfilerPhase(None, None)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.frame = None
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def beginFrame(self):
+        if self.enabled:
+            self.frame = {'start': time.perf_counter(), 'duration': 0.0, 'phases': [], 'counters': {}}
+
+    def endFrame(self):
+        if self.frame is not None:
+            self.frame['duration'] = time.perf_counter() - self.frame['start']
+            self.frames.append(self.frame)
+            self.frame = None
+
+    #Use as -> with profiler.phase('name'): ...  Phases can be nested
+    def phase(self, name):
+        if self.frame is None:
+            return self.noPhase
+        return ProfilerPhase(self.frame, name)
+
+    def count(self, name, amount = 1):
+        if self.frame is not None:
+            counters = self.frame['counters']
+            counters[name] = counters.get(name, 0) + amount
+
+    def clear(self):
+        self.frames.clear()
+
+    #Mean and worst time in ms of whole frames and of each phase per frame, and the counter totals
+    def summary(self):
+        frames = list(self.frames)
+        phases = {}
+        counters = {}
+        for frame in frames:
+            totals = {}
+            for name, start, duration in frame['phases']:
+                totals[name] = totals.get(name, 0.0) + duration
+            for name, duration in totals.items():
+                phases.setdefault(name, []).append(duration)
+            for name, amount in frame['counters'].items():
+                counters[name] = counters.get(name, 0) + amount
+        timing = lambda durations: {'frames': len(durations), 'meanMs': 1000 * sum(durations) / len(durations), 'maxMs': 1000 * max(durations)}
+        return {'frame': timing([frame['duration'] for frame in frames]) if frames else None,
+                'phases': {name: timing(durations) for name, durations in phases.items()},
+                'counters': counters}
+
+    #The n slowest frames, slowest first -> where the spikes are
+    def slowestFrames(self, n = 10):
+        return sorted(self.frames, key = lambda frame: frame['duration'], reverse = True)[:n]
+
+    def dumpJson(self, path):
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'frames': list(self.frames)}, f)
+
+    #Write the frames in the Chrome trace event format -> open it in chrome://tracing or Perfetto
+    def dumpChromeTrace(self, path):
+        events = []
+        origin = self.frames[0]['start'] if self.frames else 0.0
+        micros = lambda seconds: (seconds - origin) * 1000000
+        for number, frame in enumerate(self.frames):
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': micros(frame['start']),
+                           'dur': frame['duration'] * 1000000, 'args': {'frame': number}})
+            for name, start, duration in frame['phases']:
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': micros(start), 'dur': duration * 1000000})
+            if frame['counters']:
+                events.append({'name': 'counters', 'ph': 'C', 'pid': 1, 'tid': 1, 'ts': micros(frame['start']), 'args': frame['counters']})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+#Records one phase into a frame when its with block ends
+class ProfilerPhase:
+    __slots__ = ('frame', 'name', 'start')
+
+    def __init__(self, frame, name):
+        self.frame = frame
+        self.name = name
+
+    def __enter__(self):
+        if self.frame is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *excInfo):
+        if self.frame is not None:
+            self.frame['phases'].append((self.name, self.start, time.perf_counter() - self.start))
+
+profiler = Profiler()
+
+#Decorator that times every call of a function as a profiler phase
+def profiled(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profiler.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
 
 #Game Control Object       
 class Game:
     
-    def __init__(self,windowWidth,windowHeight):
+    #flags are passed on to pygame.display.set_mode, e.g. pygame.RESIZABLE or pygame.FULLSCREEN
+    #With FULLSCREEN a size of (0, 0) takes the size of the screen
+    def __init__(self,windowWidth,windowHeight, flags = 0):
         
         #Pygame Setup
-        self.windowWidth = windowWidth
-        self.windowHeight = windowHeight
-        self.window = pygame.display.set_mode((self.windowWidth,self.windowHeight))
+        self.windowFlags = flags
+        self.window = pygame.display.set_mode((windowWidth,windowHeight), flags)
+        self.windowWidth, self.windowHeight = self.window.get_size()
         self.clock = pygame.time.Clock()
         pygame.init()
     
         #Rooms / Levels are stored in a list
-        self.rooms = [] 
-    
+        self.rooms = []
+        self.inRoom = 0
+
+        #Event-driven mode -> the window is only drawn again when this is set
+        self.redrawNeeded = True
+
     #Begin the game loop
     def start(self):
         self.running = True #game is running or not?
@@ -25,7 +156,44 @@ class Game:
     #Stop the game loop
     def stop(self):
         self.running = False
-    
+
+    #Events after which the window has to be painted again even though nothing in the game changed
+    redrawEvents = (pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED,
+                    pygame.WINDOWSHOWN, pygame.WINDOWRESTORED)
+
+    #Returns the pending events. With wait = True, sleeps until there is one instead of returning
+    #an empty list -> a loop that only wakes up for input uses no CPU while nothing happens
+    #timeout (seconds) bounds the wait for loops that also have something to do on a timer
+    def getEvents(self, wait = False, timeout = None):
+        if wait:
+            first = pygame.event.wait() if timeout is None else pygame.event.wait(max(1, int(timeout * 1000)))
+            events = [] if first.type == pygame.NOEVENT else [first] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        for e in events:
+            if e.type in self.redrawEvents:
+                self.requestRedraw(wholeWindow = True)
+        return events
+
+    #Ask for the window to be drawn on the next frame, e.g. after the game state changed
+    #wholeWindow -> draw all of the room, not just what changed, when the window contents were lost
+    def requestRedraw(self, wholeWindow = False):
+        self.redrawNeeded = True
+        if wholeWindow:
+            self.currentRoom().invalidate()
+
+    #Give the window a new size, e.g. on VIDEORESIZE, or new flags to go in and out of fullscreen
+    #Backgrounds made for the old size are left to the game to replace
+    def resizeWindow(self, width, height, flags = None):
+        if flags is not None:
+            self.windowFlags = flags
+        self.window = pygame.display.set_mode((width, height), self.windowFlags)
+        if width and height and self.window.get_size() != (width, height):
+            #Coming out of fullscreen SDL keeps the screen size the first time -> ask again
+            self.window = pygame.display.set_mode((width, height), self.windowFlags)
+        self.windowWidth, self.windowHeight = self.window.get_size()
+        self.requestRedraw(wholeWindow = True)
+
     #Add Room to the game list
     def addRoom(self, r):
         self.rooms.append(r)
@@ -38,11 +206,13 @@ class Game:
     def goToRoom(self,x):
         self.inRoom = x
         self.rooms[self.inRoom].setDisplay()
+        self.requestRedraw(wholeWindow = True)
     
     #Send Game to the next room in the list
     def nextRoom(self):
         self.inRoom = self.inRoom + 1
         self.rooms[self.inRoom].setDisplay()
+        self.requestRedraw(wholeWindow = True)
 
     #Create a Surface to represent the background in the game with specific color
     def makeBackground(self, val):
@@ -60,6 +230,7 @@ class Game:
     
     #Create a Surface to represent an image
     def makeSpriteImage(self, picturePath):
+        profiler.count('spriteLoads')
         return pygame.image.load(picturePath).convert()
    
     #Create a font
@@ -85,51 +256,273 @@ class Game:
         return s
     
     def getCollisions(self, obj):
-        return pygame.sprite.spritecollide(obj ,self.currentRoom().roomObjects, False, pygame.sprite.collide_mask)
+        return self.currentRoom().getCollisions(obj)
                 
 #Room / Level Object       
 class Room:
     
-    def __init__(self, name, background):
-        self.roomObjects = pygame.sprite.Group() #Create a group of Game Objects
+    def __init__(self, name, background, dirtyRects = False):
+        self.roomObjects = RoomGroup(room = self) #Create a group of Game Objects
         self.background = background #Sets the background for the room
         self.name = name #Sets the name of the room
 
+        #Dirty rectangle mode -> only redraw the parts of the window that changed
+        self.dirtyRects = dirtyRects
+        self.drawnObjects = {} #object -> (image, rect) as it was last drawn
+        self.fullRedraw = True
+
+        #Clicks and collisions only look at the objects near them
+        self.grid = SpatialGrid()
+        self.stacking = {} #object -> place in the drawing order, higher is drawn later
+        self.nextStacking = 0
+
     #Add object to Room Group
     def addObject(self, obj):
         self.roomObjects.add(obj)
 
+    #Remove object from Room Group
+    def removeObject(self, obj):
+        self.roomObjects.remove(obj)
+
+    #Called by roomObjects for every object that joins it -> it goes on top and into the grid
+    def objectAdded(self, obj):
+        self.stacking[obj] = self.nextStacking
+        self.nextStacking += 1
+        self.grid.insert(obj)
+
+    #Called by roomObjects for every object that leaves it, e.g. by obj.kill()
+    def objectRemoved(self, obj):
+        del self.stacking[obj]
+        self.grid.remove(obj)
+
+    #Move an object to the top of the drawing order
+    def raiseObject(self, obj):
+        self.roomObjects.remove(obj)
+        self.roomObjects.add(obj)
+        last = self.drawnObjects.get(obj)
+        if last is not None:
+            self.drawnObjects[obj] = (None, last[1]) #so renderDirty redraws it on top
+
     #Call update function for each Game Object in the room
+    @profiled('updateObjects')
     def updateObjects(self):
         self.roomObjects.update()
     
     #Draw each Game Object in the room -> Need to know the game object to draw on
+    @profiled('renderObjects')
     def renderObjects(self,game):
         self.roomObjects.draw(game.window)
     
     #Draw the background -> Need to know the game object to draw on
+    @profiled('renderBackground')
     def renderBackground(self, game):
         game.window.blit(self.background, (0, 0))
     
+    #Replace the background, e.g. after the window changed size
+    def setBackground(self, background):
+        self.background = background
+        self.invalidate()
+
+    #Draw the whole room the next time renderDirty is called
+    #Call this after changing the background or drawing on an object's image in place
+    def invalidate(self):
+        self.fullRedraw = True
+
+    #Redraw only the regions where objects were added, removed, moved or got a new image
+    #Returns the changed rectangles to pass to pygame.display.update, empty if nothing changed
+    @profiled('renderDirty')
+    def renderDirty(self, game):
+        if self.fullRedraw:
+            self.fullRedraw = False
+            self.renderBackground(game)
+            self.renderObjects(game)
+            self.drawnObjects = {obj: (obj.image, self.drawnArea(obj)) for obj in self.roomObjects}
+            return [game.window.get_rect()]
+
+        dirty = []
+        drawn = {}
+        for obj in self.roomObjects:
+            area = self.drawnArea(obj)
+            last = self.drawnObjects.pop(obj, None)
+            if last is None or last[0] is not obj.image or last[1] != area:
+                dirty.append(area)
+                if last is not None:
+                    dirty.append(last[1])
+            drawn[obj] = (obj.image, area)
+        for image, area in self.drawnObjects.values(): #objects removed since the last frame
+            dirty.append(area)
+        self.drawnObjects = drawn
+
+        #Repaint each region from the background up, clipped so nothing outside it is touched
+        for rect in dirty:
+            game.window.set_clip(rect)
+            game.window.blit(self.background, rect, rect)
+            for obj, (image, area) in drawn.items():
+                if area.colliderect(rect):
+                    game.window.blit(image, area)
+        game.window.set_clip(None)
+        return dirty
+
+    #The part of the window an object covers -> its image can be bigger than its rect
+    def drawnArea(self, obj):
+        return pygame.Rect(obj.rect.topleft, obj.image.get_size())
+
     #Set the caption of the room window
     def setDisplay(self):
         pygame.display.set_caption(self.name)
     
-    #Check each object in the room to see what got clicked on
-    def whatGotClicked(self):
-        for obj in self.roomObjects:
-            mouseX, mouseY = pygame.mouse.get_pos()
-            maskX, maskY = (mouseX - obj.rect.x, mouseY - obj.rect.y)
-            
-            if obj.rect.collidepoint((mouseX,mouseY)) and obj.mask.get_at((maskX,maskY)):
-            
-                return obj
-                           
-                
+    #The object that got clicked on -> the topmost one with a solid pixel under the mouse, None if there is none
+    #pos defaults to where the mouse is
+    def whatGotClicked(self, pos = None):
+        hits = self.objectsAt(pos or pygame.mouse.get_pos(), 1)
+        return hits[0] if hits else None
+
+    #Objects with a solid pixel at pos, topmost first -> masks are only checked for the objects in pos's grid cell
+    def objectsAt(self, pos, limit = None):
+        x, y = pos
+        hits = []
+        for obj in sorted(self.grid.atPoint(x, y), key = self.stacking.get, reverse = True):
+            if obj.rect.collidepoint((x, y)) and obj.maskContains(x, y):
+                hits.append(obj)
+                if len(hits) == limit:
+                    break
+        return hits
+
+    #Objects whose masks overlap obj's, in drawing order like pygame.sprite.spritecollide
+    #Includes obj itself when it is in the room
+    def getCollisions(self, obj):
+        candidates = sorted(self.grid.inRect(obj.rect), key = self.stacking.get)
+        return [other for other in candidates if obj.rect.colliderect(other.rect) and pygame.sprite.collide_mask(obj, other)]
+
+#The Group of a room's objects -> however objects join or leave it, through the Room,
+#roomObjects.add(), obj.kill() or anything else, the room's grid and drawing order follow
+#Takes sprites first like any Group, so copy() works -> a copy has no room and is a plain Group
+class RoomGroup(pygame.sprite.Group):
+    def __init__(self, *sprites, room = None):
+        self.room = room
+        pygame.sprite.Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite, layer = None):
+        pygame.sprite.Group.add_internal(self, sprite, layer)
+        if self.room is not None:
+            self.room.objectAdded(sprite)
+
+    def remove_internal(self, sprite):
+        pygame.sprite.Group.remove_internal(self, sprite)
+        if self.room is not None:
+            self.room.objectRemoved(sprite)
+
+#Uniform grid over the window -> every object is listed in each cell its rect touches, so a point
+#or a rect only has to be checked against the objects in the cells it covers, not the whole room
+#Objects that moved, see TrackedRect, add themselves to stale and are only put in their new
+#cells at the next query, so moving cards around while drawing stays cheap
+class SpatialGrid:
+    def __init__(self, cellSize = 128):
+        self.cellSize = cellSize
+        self.cells = {} #(column, row) -> set of objects
+        self.objectCells = {} #object -> cells it is listed in
+        self.stale = set() #objects that moved since the last query
+
+    def cellsFor(self, rect):
+        if rect.width <= 0 or rect.height <= 0: #nothing can hit an empty rect
+            return ()
+        size = self.cellSize
+        return tuple((column, row) for column in range(rect.left // size, (rect.right - 1) // size + 1)
+                     for row in range(rect.top // size, (rect.bottom - 1) // size + 1))
+
+    def insert(self, obj):
+        self.objectCells.setdefault(obj, ())
+        self.stale.add(obj)
+        obj.spatialGrids.add(self)
+
+    def remove(self, obj):
+        self.stale.discard(obj)
+        self.uncell(obj, self.objectCells.pop(obj, ()))
+        obj.spatialGrids.discard(self)
+
+    def uncell(self, obj, cells):
+        for cell in cells:
+            objects = self.cells[cell]
+            objects.discard(obj)
+            if not objects:
+                del self.cells[cell]
+
+    #Put the objects that moved in their new cells
+    def refresh(self):
+        for obj in self.stale:
+            cells = self.cellsFor(obj.rect)
+            oldCells = self.objectCells[obj]
+            if cells != oldCells:
+                self.uncell(obj, oldCells)
+                for cell in cells:
+                    self.cells.setdefault(cell, set()).add(obj)
+                self.objectCells[obj] = cells
+        self.stale.clear()
+
+    def atPoint(self, x, y):
+        if self.stale:
+            self.refresh()
+        return self.cells.get((x // self.cellSize, y // self.cellSize), ())
+
+    def inRect(self, rect):
+        if self.stale:
+            self.refresh()
+        found = set()
+        for cell in self.cellsFor(rect):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+#A Rect that tells the object it belongs to whenever it changes, by assigning an attribute
+#or an item, e.g. rect.x = 5 or rect[0] = 5, or by an in-place method like move_ip
+#Rects made from it, e.g. by move() or copy(), have no owner and tell nobody
+class TrackedRect(pygame.Rect):
+    owner = None
+
+    def __init__(self, rect, owner):
+        pygame.Rect.__init__(self, rect)
+        object.__setattr__(self, 'owner', owner)
+
+    def __setattr__(self, name, value):
+        pygame.Rect.__setattr__(self, name, value)
+        owner = self.owner
+        if owner is not None:
+            owner.moved()
+
+    def __setitem__(self, key, value):
+        pygame.Rect.__setitem__(self, key, value)
+        owner = self.owner
+        if owner is not None:
+            owner.moved()
+
+def trackChanges(name):
+    method = getattr(pygame.Rect, name)
+    def tracked(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        owner = self.owner
+        if owner is not None:
+            owner.moved()
+        return result
+    return tracked
+
+#Every _ip method of the installed pygame, and the other methods that change the rect in place
+for name in [name for name in dir(pygame.Rect) if name.endswith('_ip')] + ['update', 'normalize']:
+    setattr(TrackedRect, name, trackChanges(name))
+
 #All Objects in the Game are part of pygames Sprite Class
 #Sprite requires an image / Surface
 #rect is a bounding box sized to the image / Surface -> Its how you control an objects position
 
+#Collision masks are only needed for clicks and collisions, so they are built the first time
+#they are used and shared by every object showing the same Surface
+maskCache = weakref.WeakKeyDictionary()
+
+def maskFor(surface):
+    mask = maskCache.get(surface)
+    if mask is None:
+        mask = pygame.mask.from_surface(surface)
+        maskCache[surface] = mask
+    return mask
+
 #Any object that is put in a room must extend GameObject
 #picture is the image of the object to display on the screen, if none given it creates a blank surface with no size
 class GameObject(pygame.sprite.Sprite):
@@ -137,20 +530,59 @@ class GameObject(pygame.sprite.Sprite):
     def __init__(self,picture = None):
         pygame.sprite.Sprite.__init__(self)
 
+        self.spatialGrids = set() #SpatialGrids of the rooms the object is in
         if picture == None:
             self.image = pygame.Surface((0,0))
         else:
             self.image = picture
     
         self.rect = self.image.get_rect()
-        self.mask = pygame.mask.from_surface(self.image)
         self.mouseHasPressedOnMe = False
 
+    #The rect is kept as a TrackedRect, so moving the object in any way keeps the rooms' grids up to date
+    @property
+    def rect(self):
+        return self._rect
+
+    @rect.setter
+    def rect(self, rect):
+        self._rect = TrackedRect(rect, self)
+        self.moved()
+
+    def moved(self):
+        for grid in self.spatialGrids:
+            grid.stale.add(self)
+
+    #Setting a new image drops the mask so it gets rebuilt from the new image
+    @property
+    def image(self):
+        return self._image
+
+    @image.setter
+    def image(self, picture):
+        self._image = picture
+        self._mask = None
+
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = maskFor(self._image)
+        return self._mask
+
+    @mask.setter
+    def mask(self, mask):
+        self._mask = mask
+
+    #Check if a window position is on a solid pixel of the object
+    def maskContains(self, x, y):
+        maskX, maskY = (x - self.rect.x, y - self.rect.y)
+        width, height = self.mask.get_size()
+        return 0 <= maskX < width and 0 <= maskY < height and self.mask.get_at((maskX,maskY))
+
     def checkMousePressedOnMe(self, e):
         mouseX, mouseY = pygame.mouse.get_pos()
-        maskX, maskY = (mouseX - self.rect.x, mouseY - self.rect.y)
         if e.type == pygame.MOUSEBUTTONDOWN:    
-            if self.rect.collidepoint((mouseX,mouseY)) and self.mask.get_at((maskX,maskY)):
+            if self.rect.collidepoint((mouseX,mouseY)) and self.maskContains(mouseX, mouseY):
                 self.mouseHasPressedOnMe = True         
 
 
@@ -184,6 +616,40 @@ class Alarm:
 
 #Text Boxes / Buttons
 
+#Least recently used cache of rendered text images, shared by every TextRectangle and TextCircle
+#so labels that show the same strings again (like "N cards left") don't render them again
+class TextCache:
+    def __init__(self, maxSize = 256):
+        self.maxSize = maxSize
+        self.images = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    #Returns the value stored for key, calling make() to create it if it isn't cached
+    def get(self, key, make):
+        value = self.images.get(key)
+        if value is not None:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return value
+
+        self.misses += 1
+        value = make()
+        self.images[key] = value
+        if len(self.images) > self.maxSize:
+            self.images.popitem(last = False)
+        return value
+
+    def clear(self):
+        self.images.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.images), 'maxSize': self.maxSize, 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0}
+
+textCache = TextCache()
+
 #Creates a transparent rectangular text box if buttonWidth, buttonHeight, buttonColor = None
 #Creates a colored rectangular text box if they are specified
 class TextRectangle(GameObject):
@@ -196,31 +662,52 @@ class TextRectangle(GameObject):
         self.buttonColor = buttonColor
         self.buttonWidth = buttonWidth
         self.buttonHeight = buttonHeight
+        self.text = None
+        self.textKey = None #cache key of the image shown
         
         self.setText(text)
         self.rect = self.image.get_rect()
-        self.mask = pygame.mask.from_surface(self.image)
 
         #Top Left Corner is position
         self.rect.x = xPos 
         self.rect.y = yPos
 
     def setText(self,text):
-        #Create the text surface
-        self.textSurface = self.font.render(text, True, self.textColor)
+        self.text = text
+        #Nothing to do if neither the text nor how it is drawn changed
+        key = ('rectangle', self.font, text, self.textColor, self.buttonWidth, self.buttonHeight, self.buttonColor)
+        if key == self.textKey:
+            return
+        self.textKey = key
+        self.image, self.textSurface = textCache.get(key, lambda: self.renderText(text))
         self.textWidth = self.textSurface.get_width()
         self.textHeight = self.textSurface.get_height()
+
+    #Draw the text with another font, e.g. a bigger one on a bigger window
+    def setFont(self, font):
+        self.font = font
+        self.setText(self.text)
+        self.rect.size = self.image.get_size()
+
+    #Returns the image and the text surface for text
+    def renderText(self, text):
+        #Create the text surface
+        profiler.count('fontRenders')
+        textSurface = self.font.render(text, True, self.textColor)
+        textWidth = textSurface.get_width()
+        textHeight = textSurface.get_height()
         
         #Create the image and draw the text centered on the image
         if self.buttonColor == None and self.buttonWidth == None and self.buttonHeight == None:
            
-            self.image = pygame.Surface((self.textWidth, self.textHeight), pygame.SRCALPHA)
-            self.image.blit(self.textSurface,(0,0))
+            image = pygame.Surface((textWidth, textHeight), pygame.SRCALPHA)
+            image.blit(textSurface,(0,0))
 
         else:
-            self.image = pygame.Surface((self.buttonWidth, self.buttonHeight))
-            self.image.fill(self.buttonColor)
-            self.image.blit(self.textSurface,(self.buttonWidth/2-self.textWidth/2,self.buttonHeight/2-self.textHeight/2))
+            image = pygame.Surface((self.buttonWidth, self.buttonHeight))
+            image.fill(self.buttonColor)
+            image.blit(textSurface,(self.buttonWidth/2-textWidth/2,self.buttonHeight/2-textHeight/2))
+        return image, textSurface
    
 
 #Draws a colored circle with text in it
@@ -232,29 +719,43 @@ class TextCircle(GameObject):
         self.textColor = textColor
         self.buttonColor = buttonColor
         self.buttonRadius = buttonRadius
+        self.text = None
+        self.textKey = None #cache key of the image shown
         
         self.setText(text)
         
         self.rect = self.image.get_rect()
-        self.mask = pygame.mask.from_surface(self.image)
 
         self.rect.centerx = xCenter
         self.rect.centery = yCenter
 
     def setText(self,text):
-        
-        #Create the text surface
-        self.textSurface = self.font.render(text, True, self.textColor)
+        self.text = text
+        #Nothing to do if neither the text nor how it is drawn changed
+        key = ('circle', self.font, text, self.textColor, self.buttonRadius, self.buttonColor)
+        if key == self.textKey:
+            return
+        self.textKey = key
+        self.image, self.textSurface, self.cir = textCache.get(key, lambda: self.renderText(text))
         self.textWidth = self.textSurface.get_width()
         self.textHeight = self.textSurface.get_height()
+
+    #Returns the image, the text surface and the circle's rect for text
+    def renderText(self, text):
+        #Create the text surface
+        profiler.count('fontRenders')
+        textSurface = self.font.render(text, True, self.textColor)
+        textWidth = textSurface.get_width()
+        textHeight = textSurface.get_height()
         
         #Create the image Surface to Draw 
-        self.image = pygame.Surface((self.buttonRadius*2 , self.buttonRadius*2), pygame.SRCALPHA)
+        image = pygame.Surface((self.buttonRadius*2 , self.buttonRadius*2), pygame.SRCALPHA)
         
         #Create the circle on the image
-        self.cir = pygame.draw.circle(self.image, self.buttonColor, (int(self.buttonRadius),int(self.buttonRadius)), int(self.buttonRadius))
+        cir = pygame.draw.circle(image, self.buttonColor, (int(self.buttonRadius),int(self.buttonRadius)), int(self.buttonRadius))
     
         #Draw the text on the image
-        self.image.blit(self.textSurface,(self.buttonRadius-self.textWidth/2,self.buttonRadius-self.textHeight/2))
+        image.blit(textSurface,(self.buttonRadius-textWidth/2,self.buttonRadius-textHeight/2))
+        return image, textSurface, cir
     
    
\ No newline at end of file
@@ -0,0 +1,305 @@
+import random
+import time
+import pytest
+from engine import Deck, MultiWarEngine, WarEngine
+from eventlog import BatchedFileSink, EventBus, INFO
+from gametrace import ReplayEngine, TraceReader, TraceWriter, record_game
+from solver import WarSolver
+from stats import GameStats, QuantileSketch, RunningStats
+from tournament import play_chunk
+
+# Checks for the headless rules in engine.py and the tools built on them.
+#
+#   python -m pytest -q test_engine.py
+
+SEEDS = range(20)
+MAX_ROUNDS = 3000
+
+def codes(cards):
+    return [card.code for card in cards]
+
+# The round logic of the original WarGame.play_round, without the drawing, as
+# the reference WarEngine has to keep to. It shuffles with rng where the game
+# used the random module.
+class OldWarGame:
+    def __init__(self, rng):
+        self.rng = rng
+        deck = Deck(rng)
+        deck.shuffle()
+        self.hands = ([], [])
+        self.won = ([], [])
+        while deck.cards:
+            self.hands[0].append(deck.deal())
+            self.hands[1].append(deck.deal())
+        self.cards_in_play = []
+        self.player_win = [False, False]
+
+    def play_card(self, player):
+        hand, won = self.hands[player], self.won[player]
+        card = hand.pop() if hand else None
+        if not hand and won:  # the won pile becomes the hand, whether or not a card was played
+            hand.extend(won)
+            won.clear()
+            self.rng.shuffle(hand)
+        return card
+
+    def award(self, player):
+        self.won[player].extend(self.cards_in_play)
+        self.cards_in_play = []
+
+    def play_round(self):
+        card1 = self.play_card(0)
+        card2 = self.play_card(1)
+        if card1 is None:
+            self.player_win = [False, True]
+            return
+        if card2 is None:
+            self.player_win = [True, False]
+            return
+        self.cards_in_play.extend([card1, card2])
+        if card1.value != card2.value:
+            self.award(0 if card1.value > card2.value else 1)
+            return
+        self.cards_in_play = [card1, card2]
+        for _ in range(2):
+            for _ in range(3):
+                for player in (0, 1):
+                    if not self.hands[player]:
+                        self.award(1 - player)
+                        return
+                    self.cards_in_play.append(self.play_card(player))
+            face_up = []
+            for player in (0, 1):
+                if not self.hands[player]:
+                    self.award(1 - player)
+                    return
+                face_up.append(self.play_card(player))
+                self.cards_in_play.append(face_up[-1])
+            if face_up[0].value != face_up[1].value:
+                self.award(0 if face_up[0].value > face_up[1].value else 1)
+                return
+
+    def winner(self):
+        for player in (0, 1):
+            if len(self.hands[player]) + len(self.won[player]) == 52 or self.player_win[player]:
+                return player + 1
+        return 0
+
+    def state(self):
+        return (codes(self.hands[0]), codes(self.won[0]), codes(self.hands[1]), codes(self.won[1]),
+                codes(self.cards_in_play), self.winner())
+
+def engine_state(engine):
+    winner = 1 if engine.winner is engine.player1 else 2 if engine.winner is engine.player2 else 0
+    return (codes(engine.player1.hand), codes(engine.player1.won_cards), codes(engine.player2.hand),
+            codes(engine.player2.won_cards), codes(engine.cards_in_play), winner)
+
+def test_engine_matches_old_round_logic():
+    for seed in SEEDS:
+        old = OldWarGame(random.Random(seed))
+        engine = WarEngine(rng=random.Random(seed))
+        assert engine_state(engine) == old.state()
+        while not engine.finished() and engine.rounds < MAX_ROUNDS:
+            engine.step()
+            old.play_round()
+            assert engine_state(engine) == old.state(), f'seed {seed} round {engine.rounds}'
+
+# The mean and its standard error
+def mean_and_error(values):
+    count = len(values)
+    mean = sum(values) / count
+    variance = sum((value - mean) ** 2 for value in values) / (count - 1)
+    return mean, (variance / count) ** 0.5
+
+def test_batch_matches_engine_statistics():
+    pytest.importorskip('numpy')
+    from batch import simulate
+    games = 2000
+    rounds, wars, player1_wins = [], [], 0
+    rng = random.Random(1)
+    for _ in range(games):
+        engine = WarEngine(rng=random.Random(rng.getrandbits(64)))
+        game_wars = 0
+        while not engine.finished() and engine.rounds < 10000:
+            game_wars += engine.step().wars
+        rounds.append(engine.rounds)
+        wars.append(game_wars)
+        player1_wins += engine.winner is engine.player1
+    batch = simulate(games, seed=1, max_rounds=10000)
+    # the two draw different random numbers, so only the distributions can agree
+    for name, values in (('rounds', rounds), ('wars', wars)):
+        mean, error = mean_and_error(values)
+        batch_mean, batch_error = mean_and_error(batch[name].tolist())
+        assert abs(mean - batch_mean) < 5 * (error ** 2 + batch_error ** 2) ** 0.5, name
+    win_error = (0.25 / games) ** 0.5
+    assert abs(player1_wins / games - (batch['winners'] == 1).mean()) < 5 * 2 ** 0.5 * win_error
+
+def test_solver_matches_played_games():
+    games = 4000
+    for ranks, copies in ((3, 2), (2, 4)):
+        player1, player2, expected_rounds = WarSolver(ranks, copies).evaluate_all_deals()
+        assert player1 + player2 == pytest.approx(1)
+        rng = random.Random(ranks * 10 + copies)
+        rounds, player1_wins = [], 0
+        for _ in range(games):
+            engine = WarEngine(rng=random.Random(rng.getrandbits(64)), ranks=ranks, copies=copies)
+            player1_wins += engine.play_to_completion(10000) is engine.player1
+            rounds.append(engine.rounds)
+        assert abs(player1_wins / games - player1) < 5 * (player1 * player2 / games) ** 0.5, f'{ranks} ranks x {copies}'
+        mean, error = mean_and_error(rounds)
+        assert abs(mean - expected_rounds) < 5 * error, f'{ranks} ranks x {copies}'
+
+def test_trace_replays_recorded_games(tmp_path):
+    path = tmp_path / 'games.wtr'
+    max_rounds = {0: 10000, 1: 100, 2: 10000, 3: 37}  # games 1 and 3 stop before anyone wins
+    with TraceWriter(path, keyframe_interval=16) as writer:
+        for game, rounds in max_rounds.items():
+            record_game(writer, WarEngine(rng=random.Random(game)), game, rounds)
+    with TraceReader(path) as reader:
+        assert len(reader) == len(max_rounds)
+        for game, rounds in max_rounds.items():
+            trace = reader.game(game)
+            for start in (0, 20, trace.rounds // 2):
+                engine = WarEngine(rng=random.Random(game))
+                engine.play_to_completion(start)
+                replay = ReplayEngine(trace, start)
+                assert engine_state(replay) == engine_state(engine)
+                for _ in range(trace.rounds - replay.rounds):
+                    assert not replay.finished()
+                    replay.step()
+                    engine.step()
+                    assert engine_state(replay) == engine_state(engine), f'game {game} round {replay.rounds}'
+                assert replay.finished()  # with a winner or, for games cut short, at the end of the trace
+            if rounds < 1000:
+                assert (trace.rounds, trace.winner) == (rounds, 0)
+
+def test_batched_file_sink_flushes_a_quiet_bus(tmp_path):
+    path = tmp_path / 'war.log'
+    bus = EventBus()
+    sink = bus.add_sink(BatchedFileSink(path, flush_interval=0.05), INFO)
+    bus.info('game.winner', '{player} is the winner!', player='You')
+    assert path.read_text() == ''  # still batched
+    deadline = time.monotonic() + 5
+    while not path.read_text() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert path.read_text().endswith('INFO game.winner You is the winner!\n')
+    sink.close()
+
+# Play on for rounds, returning the state after each
+def future(engine, rounds):
+    states = []
+    for _ in range(rounds):
+        engine.step()
+        states.append(engine_state(engine))
+    return states
+
+def test_restore_and_fork_replay_the_same_future():
+    for seed in range(5):
+        engine = WarEngine(rng=random.Random(seed), detect_cycles=True)
+        engine.play_to_completion(30)
+        snapshot = engine.snapshot()
+        twin = engine.fork()
+        expected = future(engine, 200)
+        assert future(twin, 200) == expected
+        engine.restore(snapshot)
+        assert future(engine, 200) == expected
+
+def test_snapshot_of_a_big_deck():
+    engine = WarEngine(rng=random.Random(3), copies=20)  # 260 cards, too many to index with a byte
+    engine.play_to_completion(10)
+    snapshot = engine.snapshot()
+    expected = future(engine, 50)
+    engine.restore(snapshot)
+    assert future(engine, 50) == expected
+
+# Shuffles like random.Random but can't tell its state
+class StatelessRng:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def shuffle(self, cards):
+        self.rng.shuffle(cards)
+
+def test_fork_needs_an_rng_it_can_copy():
+    engine = WarEngine(rng=StatelessRng(1))
+    with pytest.raises(ValueError):
+        engine.fork()
+    twin = engine.fork(rng=random.Random(2))
+    assert engine_state(twin) == engine_state(engine)
+
+# The state after rounds rounds of a game without shuffling won cards, played without cycle detection
+def state_after(seed, rounds):
+    engine = WarEngine(rng=random.Random(seed), shuffle_won=False)
+    engine.play_to_completion(rounds)
+    assert engine.rounds == rounds
+    return engine_state(engine)
+
+def test_cycles_repeat_the_game():
+    cycles = {}
+    for seed in range(40):
+        engine = WarEngine(rng=random.Random(seed), shuffle_won=False, detect_cycles=True)
+        engine.play_to_completion(20000)
+        if engine.cycle is not None:
+            assert engine.winner is None and engine.finished()
+            cycles[seed] = engine.cycle
+    assert cycles  # seed 17 repeats itself
+    for seed, (first, period) in cycles.items():
+        engine = WarEngine(rng=random.Random(seed), shuffle_won=False)
+        engine.play_to_completion(first)
+        start = engine_state(engine)
+        states = future(engine, period)
+        assert states[-1] == start
+        assert start not in states[:-1]  # and not any sooner
+        # a table too small for the whole game starts over and still catches the cycle
+        engine = WarEngine(rng=random.Random(seed), shuffle_won=False, detect_cycles=True, max_states=period + 8)
+        engine.play_to_completion(20000)
+        assert engine.seen_states.resets > 0
+        assert engine.cycle[1] == period and engine.cycle[0] >= first
+        assert state_after(seed, sum(engine.cycle)) == state_after(seed, engine.cycle[0])
+
+def test_multi_engine_keeps_every_card():
+    for players in range(2, 53):
+        for seed in range(3):
+            engine = MultiWarEngine(players, rng=random.Random(seed))
+            cards = set(engine.cards)
+            while not engine.finished() and engine.rounds < 2000:
+                engine.step()
+                held = [card for player in engine.players for pile in (player.hand, player.won_cards) for card in pile]
+                held += engine.cards_in_play
+                assert len(held) == len(cards) and set(held) == cards, f'{players} players, seed {seed}, round {engine.rounds}'
+            if engine.winner is not None:
+                assert engine.winner.card_total() == engine.card_count
+
+def test_stats_merge_like_a_single_pass():
+    rng = random.Random(4)
+    values = [rng.lognormvariate(5, 1) for _ in range(5000)] + [0] * 50
+    rng.shuffle(values)
+    whole_stats, whole_sketch = RunningStats(), QuantileSketch()
+    for value in values:
+        whole_stats.add(value)
+        whole_sketch.add(value)
+    merged_stats, merged_sketch = RunningStats(), QuantileSketch()
+    for start in range(0, len(values), 700):  # uneven chunks, as workers would return them
+        stats, sketch = RunningStats(), QuantileSketch()
+        for value in values[start:start + 700]:
+            stats.add(value)
+            sketch.add(value)
+        merged_stats.merge(stats)
+        merged_sketch.merge(sketch)
+    assert merged_stats.count == whole_stats.count == len(values)
+    assert merged_stats.mean == pytest.approx(whole_stats.mean, rel=1e-12)
+    assert merged_stats.variance() == pytest.approx(whole_stats.variance(), rel=1e-9)
+    assert (merged_stats.min, merged_stats.max) == (whole_stats.min, whole_stats.max) == (min(values), max(values))
+    ordered = sorted(values)
+    for q in (0, 0.01, 0.5, 0.9, 0.99, 1):
+        assert merged_sketch.quantile(q) == whole_sketch.quantile(q)
+        exact = ordered[int(q * (len(values) - 1))]
+        assert merged_sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+def test_game_stats_merge_and_round_trip(tmp_path):
+    whole = play_chunk(7, 0, 60)
+    merged = play_chunk(7, 0, 25).merge(play_chunk(7, 25, 60))
+    assert merged.report() == whole.report()
+    path = tmp_path / 'stats.json'
+    merged.dump(path)
+    assert GameStats.load(path).as_dict() == merged.as_dict()
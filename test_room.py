@@ -0,0 +1,96 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import random
+import pygame
+import pytest
+from test import Game, GameObject, Room
+
+# Checks for the Room in test.py: its grid has to find the same objects as looking at
+# every object, however the objects are moved and however they join or leave the room.
+#
+#   python -m pytest -q test_room.py
+
+WIDTH, HEIGHT = 800, 600
+
+@pytest.fixture
+def game():
+    game = Game(WIDTH, HEIGHT)
+    yield game
+    pygame.quit()
+
+# A round object, so clicks and collisions depend on the masks and not only the rects
+def ball(rng):
+    surface = pygame.Surface((rng.randint(0, 120), rng.randint(0, 120)), pygame.SRCALPHA)
+    if surface.get_width() and surface.get_height():
+        pygame.draw.circle(surface, (255, 0, 0), surface.get_rect().center, min(surface.get_size()) // 2)
+    obj = GameObject(surface)
+    obj.rect.topleft = (rng.randint(-50, WIDTH), rng.randint(-50, HEIGHT))
+    return obj
+
+# The topmost object under pos, looking at every object in the room
+def clicked(room, pos):
+    for obj in reversed(room.roomObjects.sprites()):
+        if obj.rect.collidepoint(pos) and obj.maskContains(*pos):
+            return obj
+    return None
+
+# Every way the room's objects can move, join or leave it. The rects keep the size of
+# the images, as spritecollide goes by the masks alone and the room by rects and masks.
+def change(rng, room, obj):
+    move = rng.randrange(12)
+    if move == 0:
+        obj.rect.x = rng.randint(-50, WIDTH)
+    elif move == 1:
+        obj.rect[0] = rng.randint(-50, WIDTH)
+    elif move == 2:
+        obj.rect[0:2] = (rng.randint(-50, WIDTH), rng.randint(-50, HEIGHT))
+    elif move == 3:
+        obj.rect.update((rng.randint(0, WIDTH), rng.randint(0, HEIGHT)), obj.rect.size)
+    elif move == 4:
+        obj.rect.move_ip(rng.randint(-100, 100), rng.randint(-100, 100))
+    elif move == 5:
+        obj.rect = obj.rect.move(rng.randint(-100, 100), 3)
+    elif move == 6:
+        obj.rect.center = (rng.randint(0, WIDTH), rng.randint(0, HEIGHT))
+    elif move == 7:
+        obj.kill()
+    elif move == 8:
+        room.roomObjects.add(obj)
+    elif move == 9:
+        room.roomObjects.remove(obj)
+    elif move == 10:
+        room.addObject(obj)
+    else:
+        room.raiseObject(obj)
+
+def test_grid_finds_what_a_full_scan_finds(game):
+    rng = random.Random(1)
+    room = Room('grid', game.makeBackground((0, 0, 0)))
+    game.addRoom(room)
+    objects = [ball(rng) for _ in range(300)]
+    for obj in objects:
+        room.addObject(obj)
+    for step in range(300):
+        obj = rng.choice(objects)
+        if step % 7 == 0 and obj not in room.roomObjects:
+            room.addObject(obj)
+        change(rng, room, obj)
+        for _ in range(30):
+            pos = (rng.randrange(WIDTH), rng.randrange(HEIGHT))
+            assert room.whatGotClicked(pos) is clicked(room, pos), f'step {step} at {pos}'
+        other = rng.choice(objects)
+        assert room.getCollisions(other) == pygame.sprite.spritecollide(other, room.roomObjects, False, pygame.sprite.collide_mask), f'step {step}'
+    room.roomObjects.empty()
+    assert not room.grid.objectCells and not room.grid.cells and not room.stacking
+
+def test_copy_of_the_room_group(game):
+    rng = random.Random(2)
+    room = Room('copy', game.makeBackground((0, 0, 0)))
+    objects = [ball(rng) for _ in range(10)]
+    for obj in objects:
+        room.addObject(obj)
+    copy = room.roomObjects.copy()
+    assert copy.sprites() == room.roomObjects.sprites()
+    copy.remove(objects[0])  # the copy isn't the room's, changing it leaves the room alone
+    assert objects[0] in room.roomObjects and objects[0] in room.stacking
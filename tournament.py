@@ -0,0 +1,81 @@
+import argparse
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from engine import WarEngine
+from stats import GameStats, GameSummary
+
+# Runs simulated games on every core. Each game gets its own random.Random seeded
+# from (seed, game number), so a game plays out the same way whichever worker and
+# chunk it lands in, and a tournament is bit-identical for any worker count.
+# Workers send back a stats.GameStats per chunk instead of a row per game, so a
+# run of any size is merged in constant memory.
+
+def game_rng(seed, game):
+    return random.Random(f'{seed}:{game}')
+
+# Play one game to the end and sum it up in a stats.GameSummary. The lead changes
+# when the other player comes to hold more cards, ties keep the last leader.
+def play_game(seed, game, max_rounds=10000, shuffle_won=True, detect_cycles=False):
+    engine = WarEngine(rng=game_rng(seed, game), shuffle_won=shuffle_won, detect_cycles=detect_cycles)
+    player1, player2 = engine.player1, engine.player2
+    wars = 0
+    war_depths = Counter()
+    leader = 0
+    lead_changes = 0
+    while not engine.finished() and engine.rounds < max_rounds:
+        result = engine.step()
+        if result.war:
+            wars += result.wars
+            war_depths[result.wars] += 1
+        difference = player1.card_total() - player2.card_total()
+        if difference:
+            now_leading = 1 if difference > 0 else 2
+            lead_changes += leader != 0 and now_leading != leader
+            leader = now_leading
+    if engine.winner is None:
+        winner = 0
+    else:
+        winner = 1 if engine.winner is player1 else 2
+    return GameSummary(winner, engine.cycle is not None, engine.rounds, wars, engine.total_cards_played,
+                       player1.shuffles + player2.shuffles, lead_changes, war_depths)
+
+def play_chunk(seed, start, stop, max_rounds=10000, shuffle_won=True, detect_cycles=False):
+    stats = GameStats()
+    for game in range(start, stop):
+        stats.add(play_game(seed, game, max_rounds, shuffle_won, detect_cycles))
+    return stats
+
+# Yield a GameStats for each chunk of games 0..games-1, in game order
+def run_tournament(games, seed=0, workers=None, chunk_size=1000, max_rounds=10000, shuffle_won=True, detect_cycles=False):
+    starts = range(0, games, chunk_size)
+    stops = [min(start + chunk_size, games) for start in starts]
+    count = len(starts)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(play_chunk, [seed] * count, starts, stops, [max_rounds] * count, [shuffle_won] * count, [detect_cycles] * count)
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many War games on all cores.')
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--max-rounds', type=int, default=10000)
+    parser.add_argument('--no-shuffle', action='store_true', help='won cards go back into the hand unshuffled')
+    parser.add_argument('--detect-cycles', action='store_true', help='stop games that repeat a state')
+    parser.add_argument('--stats-out', metavar='PATH', help='save the statistics to merge with other runs (see stats.py)')
+    parser.add_argument('--merge', metavar='PATH', action='append', default=[], help='add the statistics of an earlier run to the report')
+    args = parser.parse_args()
+
+    stats = GameStats()
+    for chunk in run_tournament(args.games, args.seed, args.workers, args.chunk_size, args.max_rounds, not args.no_shuffle, args.detect_cycles):
+        stats.merge(chunk)
+    for path in args.merge:
+        stats.merge(GameStats.load(path))
+    print(stats.report())
+    if args.stats_out:
+        stats.dump(args.stats_out)
+
+if __name__ == "__main__":
+    main()